@@ -1 +1,3 @@
-from iothello.gui import play
+def play(size=None):
+    from iothello.gui import play
+    play(size)
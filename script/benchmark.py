@@ -0,0 +1,265 @@
+""" Benchmarks of the engine, results are printed as JSON so that they can be compared across commits.
+
+    python -m iothello.benchmark                                 # every benchmark
+    python -m iothello.benchmark movegen flips --output new.json
+    python -m iothello.benchmark --output new.json --compare old.json
+    python -m iothello.benchmark games --profile games.prof     # cProfile report of the run
+
+The positions are drawn from seeded random games, the same ones at every run. Rates are operations per second,
+--compare reports the rates which dropped and the startup times which rose by more than the tolerance.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+from time import perf_counter
+
+import numpy as np
+
+from iothello.bitboard import SIZE, MAX_MOVES, board_geometry, iter_squares
+from iothello.instrumentation import profile
+
+# leaf counts from the starting position per board size, the 6x6 ones checked against the original nested loops
+# implementation, the 8x8 ones are the published perft of Othello
+PERFT = {6: (4, 12, 56, 244, 1364, 7604, 47740, 308716),
+         8: (4, 12, 56, 244, 1396, 8200, 55092, 390216)}.get(SIZE, ())
+PHASES = {'opening': range(0, 8), 'midgame': range(MAX_MOVES * 3 // 8, MAX_MOVES * 5 // 8),
+          'endgame': range(MAX_MOVES - 10, MAX_MOVES - 4)}
+
+IMPORT_SNIPPET = '''
+import time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+'''
+
+# the first pg.display.update of iothello.play() is the first frame, the process exits right after it
+FIRST_FRAME_SNIPPET = '''
+import os, time
+start = time.perf_counter()
+import pygame as pg
+update = pg.display.update
+def first_frame(*args):
+    update(*args)
+    print(time.perf_counter() - start, flush=True)
+    os._exit(0)
+pg.display.update = first_frame
+import iothello
+iothello.play()
+'''
+
+
+def run_snippet(snippet):
+    """ Runs `snippet` in a fresh interpreter, returns (seconds printed by the snippet, seconds of the whole process) """
+    env = dict(os.environ, SDL_VIDEODRIVER=os.environ.get('SDL_VIDEODRIVER', 'dummy'),
+               SDL_AUDIODRIVER=os.environ.get('SDL_AUDIODRIVER', 'dummy'))
+    start = perf_counter()
+    output = subprocess.run([sys.executable, '-c', snippet], capture_output=True, text=True, check=True, env=env)
+    return float(output.stdout.split()[-1]), perf_counter() - start
+
+
+def startup(repeat=5):
+    """ Import time of the modules and time to the first frame of iothello.play(), best of `repeat` cold starts """
+    results = {}
+    for module in ('iothello', 'iothello.backend_gui', 'iothello.gui', 'iothello.research'):
+        results[f'import {module}'] = min(run_snippet(IMPORT_SNIPPET.format(module=module))[0] for _ in range(repeat))
+    first_frames = [run_snippet(FIRST_FRAME_SNIPPET) for _ in range(repeat)]
+    results['first frame'] = min(seconds for seconds, _ in first_frames)
+    results['first frame with interpreter start'] = min(seconds for _, seconds in first_frames)
+    return results
+
+
+def positions(phase, count=200, seed=0):
+    """ (Position, player to move) of `count` boards of `phase` from seeded random games, leaving out the games
+    already over """
+    from iothello.core import Position
+    from iothello.simulation import random_games
+    geometry = board_geometry()
+    X, _, players = random_games(count, seed=seed, return_players=True)
+    rng = np.random.default_rng(seed)
+    moves = rng.choice(PHASES[phase], size=count)
+    sample = []
+    for game, move in enumerate(moves):
+        if players[move, game]:
+            board = X[move, game].reshape(SIZE, SIZE)
+            sample.append((Position(*geometry.pack(board, offset=0), geometry), int(players[move, game])))
+    return sample
+
+
+def rate(function, items, min_seconds=0.2):
+    """ Calls function on every item, again and again for at least `min_seconds`, returns the items per second """
+    count = 0
+    start = perf_counter()
+    while True:
+        for item in items:
+            function(item)
+        count += len(items)
+        elapsed = perf_counter() - start
+        if elapsed >= min_seconds:
+            return count / elapsed
+
+
+def movegen():
+    """ Positions per second of move generation: bitboards, research.Othello.find_possible_moves and next_layer """
+    from iothello.research import Othello
+    geometry = board_geometry()
+    othello = Othello()
+    results = {}
+    for phase in PHASES:
+        sample = positions(phase)
+        bitboards = [position.relative(player) for position, player in sample]
+        lists = [(geometry.unpack_padded(position.white, position.black), player) for position, player in sample]
+        arrays = [(np.array(board, dtype=np.int8), player) for board, player in lists]
+        results[f'{phase} legal_moves'] = rate(lambda item: geometry.legal_moves(*item), bitboards)
+        results[f'{phase} find_possible_moves'] = rate(lambda item: othello.find_possible_moves(*item), lists)
+        results[f'{phase} next_layer'] = rate(lambda item: othello.next_layer(*item), arrays)
+    return results
+
+
+def flips():
+    """ Moves played per second: bitboards and research.Othello.update_board """
+    from iothello.research import Othello
+    geometry = board_geometry()
+    othello = Othello()
+    results = {}
+    for phase in PHASES:
+        bitboard_moves, list_moves = [], []
+        for position, player in positions(phase):
+            own, opp = position.relative(player)
+            board = geometry.unpack_padded(position.white, position.black)
+            for square in iter_squares(position.moves(player)):
+                bitboard_moves.append((own, opp, square))
+                list_moves.append((board, square // SIZE + 1, square % SIZE + 1, player))
+        results[f'{phase} play'] = rate(lambda item: geometry.play(*item), bitboard_moves)
+        results[f'{phase} update_board'] = rate(lambda item: othello.update_board(*item), list_moves)
+    return results
+
+
+def evaluation():
+    """ Boards scored per second, in batches by the models and one by one by the lookup tables of Evaluator """
+    from iothello.evaluation import Evaluator, predict
+    from iothello.weights import load_models
+    models = load_models()
+    evaluator = Evaluator(models)
+    sample = [position for phase in PHASES for position, _ in positions(phase)]
+    boards = board_geometry().unpack_many([position.white for position in sample],
+                                          [position.black for position in sample])
+    batch = np.tile(boards, (10000 // len(boards) + 1, 1))[:10000]
+    return {'batch predict': rate(lambda model: predict(model, batch), models[:1]) * len(batch),
+            'evaluator': rate(lambda position: evaluator(position.white, position.black), sample)}
+
+
+def games(count=20):
+    """ Games per second: test_vs_random_bot with the models and batched random self-play """
+    from iothello.research import Othello
+    from iothello.simulation import random_games
+    othello = Othello()
+    random.seed(0)
+    start = perf_counter()
+    for game in range(count):
+        othello.test_vs_random_bot(game)
+    results = {'test_vs_random_bot': count / (perf_counter() - start)}
+    start = perf_counter()
+    random_games(10000, seed=0)
+    results['random_games'] = 10000 / (perf_counter() - start)
+    return results
+
+
+def search(depth=4):
+    """ Nodes per second of the alpha-beta search at `depth` on midgame positions """
+    from iothello.core import Engine
+    from iothello.search import Search
+    engine = Engine()
+    engine.load_engine()
+    nodes = 0
+    start = perf_counter()
+    for position, player in positions('midgame', count=20):
+        if position.moves(player):
+            searcher = Search(engine.evaluator, depth)
+            searcher.best_move(*position.relative(player), player)
+            nodes += searcher.nodes
+    return {f'depth {depth} nodes': nodes / (perf_counter() - start)}
+
+
+def perft(depth=7):
+    """ Leaf counts from the starting position: fails if they differ from PERFT, else reports leaves per second """
+    geometry = board_geometry()
+    legal_moves, play = geometry.legal_moves, geometry.play
+
+    def count(own, opp, depth):
+        if depth == 0:
+            return 1
+        moves = legal_moves(own, opp)
+        if moves == 0:
+            if legal_moves(opp, own) == 0:
+                return 1
+            return count(opp, own, depth - 1)
+        leaves = 0
+        for square in iter_squares(moves):
+            new_own, new_opp = play(own, opp, square)
+            leaves += count(new_opp, new_own, depth - 1)
+        return leaves
+
+    results = {}
+    for current in range(1, depth + 1):
+        start = perf_counter()
+        leaves = count(geometry.START_WHITE, geometry.START_BLACK, current)
+        if current <= len(PERFT) and leaves != PERFT[current - 1]:
+            raise AssertionError(f'perft({current}) = {leaves}, expected {PERFT[current - 1]}')
+        results[f'depth {current} leaves'] = leaves
+    results['leaves'] = leaves / (perf_counter() - start)
+    return results
+
+
+def compare(old, new, tolerance=0.1):
+    """ Rates of `new` lower than (1 - tolerance) times the ones of `old`, and startup times higher than
+    (1 + tolerance) times them, as {benchmark: {name: (old, new)}}. Leaf counts are left out, perft checks them. """
+    regressions = {}
+    for name, results in new.items():
+        if name == 'perft':
+            continue
+        for key, value in results.items():
+            previous = old.get(name, {}).get(key)
+            if previous is None:
+                continue
+            if value > previous * (1 + tolerance) if name == 'startup' else value < previous * (1 - tolerance):
+                regressions.setdefault(name, {})[key] = (previous, value)
+    return regressions
+
+
+BENCHMARKS = {'startup': startup, 'movegen': movegen, 'flips': flips, 'evaluation': evaluation, 'games': games,
+              'search': search, 'perft': perft}
+
+
+def run(names=()):
+    """ Results of the benchmarks `names`, of all of them when empty """
+    return {name: BENCHMARKS[name]() for name in names or BENCHMARKS}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('names', nargs='*', help=f'any of {", ".join(BENCHMARKS)}, all of them by default')
+    parser.add_argument('--output', help='file to save the results to')
+    parser.add_argument('--compare', help='results of a previous run, exits with 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    parser.add_argument('--profile', help='file to save the cProfile of the run to, a report is printed on stderr')
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f'unknown benchmarks: {", ".join(unknown)}')
+    if args.profile is None:
+        all_results = run(args.names)
+    else:
+        all_results = profile(lambda: run(args.names), args.profile)
+    print(json.dumps(all_results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(all_results, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            found = compare(json.load(file), all_results, args.tolerance)
+        if found:
+            print(json.dumps({'regressions': found}, indent=2))
+            sys.exit(1)
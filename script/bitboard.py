@@ -0,0 +1,219 @@
+""" Bitboard move engine for boards of 4x4, 6x6 or 8x8 squares.
+
+Every player is packed into a SQUARES-bit integer, square (row, col) being bit row * SIZE + col: 36 bits for 6x6 and
+64 for the standard 8x8 board, so arrays of bitboards are uint64. A Geometry holds the masks, start position and move
+generation of a size, board_geometry(size) returns the shared one. Engines, front ends and servers take a size and
+keep its Geometry; the module constants are the ones of the default size, 6 unless the environment variable
+IOTHELLO_SIZE says otherwise, used by the scripts working on a single size as the simulation and training.
+Move generation and flips work with shifts and masks instead of walking the board. With the environment variable
+IOTHELLO_KERNELS=numba, the legal_moves and flips of the geometries of board_geometry are the compiled kernels of
+iothello.kernels.
+"""
+import os
+
+import numpy as np
+
+SIZES = (4, 6, 8)
+SIZE = int(os.environ.get('IOTHELLO_SIZE', 6))
+KERNELS = os.environ.get('IOTHELLO_KERNELS', 'python') == 'numba'
+
+if hasattr(int, 'bit_count'):
+    popcount = int.bit_count
+else:
+    def popcount(x):
+        return bin(x).count('1')
+
+
+def move_functions(directions, full, extra_shifts):
+    """ (legal_moves, flips) of a board, closures over its masks so that they cost no more than module globals """
+
+    def legal_moves(own, opp):
+        """ Mask of the squares where the player owning `own` can move. """
+        moves = 0
+        for direction, mask in directions:
+            flankable = opp & mask
+            # at most SIZE - 2 opponent pieces can be flanked in a line
+            x = (own << direction) & flankable
+            x |= (x << direction) & flankable
+            x |= (x << direction) & flankable
+            x |= (x << direction) & flankable
+            for _ in range(extra_shifts):
+                x |= (x << direction) & flankable
+            moves |= x << direction
+            x = (own >> direction) & flankable
+            x |= (x >> direction) & flankable
+            x |= (x >> direction) & flankable
+            x |= (x >> direction) & flankable
+            for _ in range(extra_shifts):
+                x |= (x >> direction) & flankable
+            moves |= x >> direction
+        return moves & full & ~(own | opp)
+
+    def flips(own, opp, square):
+        """ Mask of the opponent pieces flipped by playing on `square`. """
+        move = 1 << square
+        flipped = 0
+        for direction, mask in directions:
+            flankable = opp & mask
+            line = 0
+            x = (move << direction) & flankable
+            while x:
+                line |= x
+                x <<= direction
+                if x & own:
+                    flipped |= line
+                    break
+                x &= flankable
+            line = 0
+            x = (move >> direction) & flankable
+            while x:
+                line |= x
+                x >>= direction
+                if x & own:
+                    flipped |= line
+                    break
+                x &= flankable
+        return flipped
+
+    return legal_moves, flips
+
+
+def play_function(flips):
+    """ play of a board from its flips """
+
+    def play(own, opp, square):
+        """ Returns (own, opp) after the player owning `own` moves on `square`. """
+        flipped = flips(own, opp, square)
+        return own | flipped | (1 << square), opp & ~flipped
+
+    return play
+
+
+def iter_squares(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def relative(white, black, player):
+    """ Returns (own, opp) for `player`: 1 is white, -1 is black. """
+    if player == 1:
+        return white, black
+    return black, white
+
+
+def absolute(own, opp, player):
+    """ Inverse of relative, returns (white, black). """
+    if player == 1:
+        return own, opp
+    return opp, own
+
+
+def unpack_bits(masks, squares):
+    """ (N,) masks to a (N, squares) array of 0 and 1 """
+    data = np.asarray(masks, dtype='<u8').view(np.uint8).reshape(-1, 8)
+    return np.unpackbits(data, axis=1, count=squares, bitorder='little')
+
+
+if hasattr(np, 'bitwise_count'):
+    def popcount_many(masks):
+        return np.bitwise_count(masks)
+else:
+    def popcount_many(masks):
+        return unpack_bits(masks, 64).sum(axis=1)
+
+
+class Geometry:
+    """ The SIZE x SIZE board: its masks, start position and move generation.
+
+    legal_moves, flips and play are plain functions, replaced by the kernels when they are on; python_legal_moves
+    and python_flips stay the pure Python reference, and python_legal_moves works on numpy arrays of bitboards too.
+    """
+
+    def __init__(self, size):
+        if size not in SIZES:
+            raise ValueError(f'The board size must be 4, 6 or 8, not {size}')
+        self.SIZE = size
+        self.SQUARES = size * size
+        self.MAX_MOVES = self.SQUARES - 4
+        self.FULL = (1 << self.SQUARES) - 1
+        not_first_col = self.FULL & ~sum(1 << (row * size) for row in range(size))
+        not_last_col = self.FULL & ~sum(1 << (row * size + size - 1) for row in range(size))
+        inner_cols = not_first_col & not_last_col
+        # (shift, mask of the opponent pieces which can be flanked along it): pieces on the first and last column
+        # can't be flanked horizontally or diagonally, masking them away also stops the shifts from wrapping around
+        self.DIRECTIONS = ((1, inner_cols), (size, self.FULL), (size + 1, inner_cols), (size - 1, inner_cols))
+        # the unrolled shifts of legal_moves reach lines of 4 opponent pieces, these extra ones the longer lines of 8x8
+        self.EXTRA_SHIFTS = max(size - 6, 0)
+        self.BITS = np.left_shift(np.uint64(1), np.arange(self.SQUARES, dtype=np.uint64))
+        center = size // 2
+        self.START_WHITE = (1 << ((center - 1) * size + center)) | (1 << (center * size + center - 1))
+        self.START_BLACK = (1 << ((center - 1) * size + center - 1)) | (1 << (center * size + center))
+        self.python_legal_moves, self.python_flips = move_functions(self.DIRECTIONS, self.FULL, self.EXTRA_SHIFTS)
+        self.legal_moves, self.flips = self.python_legal_moves, self.python_flips
+        self.play = play_function(self.flips)
+
+    def __repr__(self):
+        return f'Geometry({self.SIZE})'
+
+    def pack(self, board, offset=1):
+        """ Packs a board indexed as board[row + offset][col + offset] into (white, black). """
+        size = self.SIZE
+        if isinstance(board, np.ndarray):
+            cells = board[offset:size + offset, offset:size + offset].ravel()
+            return int(self.BITS[cells == 1].sum()), int(self.BITS[cells == -1].sum())
+        white = black = 0
+        bit = 1
+        for row in range(offset, size + offset):
+            line = board[row]
+            for col in range(offset, size + offset):
+                cell = line[col]
+                if cell == 1:
+                    white |= bit
+                elif cell == -1:
+                    black |= bit
+                bit <<= 1
+        return white, black
+
+    def unpack(self, white, black):
+        """ Returns the (SQUARES,) int8 array of the board, 1 for white and -1 for black. """
+        bits = self.BITS
+        return ((bits & np.uint64(white)) != 0).astype(np.int8) - ((bits & np.uint64(black)) != 0).astype(np.int8)
+
+    def unpack_many(self, whites, blacks):
+        """ Vectorized unpack, returns a (N, SQUARES) int8 array. """
+        return unpack_bits(whites, self.SQUARES).view(np.int8) - unpack_bits(blacks, self.SQUARES).view(np.int8)
+
+    def unpack_padded(self, white, black):
+        """ Returns the board as the (SIZE + 2) x (SIZE + 2) padded list of lists used by research.Othello. """
+        size = self.SIZE
+        board = [[0] * (size + 2) for _ in range(size + 2)]
+        for square in iter_squares(white):
+            board[square // size + 1][square % size + 1] = 1
+        for square in iter_squares(black):
+            board[square // size + 1][square % size + 1] = -1
+        return board
+
+
+GEOMETRIES = {}
+
+
+def board_geometry(size=None):
+    """ The shared Geometry of `size`, of the default size when None """
+    size = SIZE if size is None else size
+    if size not in GEOMETRIES:
+        board = Geometry(size)
+        if KERNELS:
+            from iothello import kernels
+            kernels.install(board)
+        GEOMETRIES[size] = board
+    return GEOMETRIES[size]
+
+
+# only the constants of the default size: building its shared geometry here would install the kernels while this
+# module is still loading, and iothello.kernels imports it
+_default = Geometry(SIZE)
+SQUARES, MAX_MOVES = _default.SQUARES, _default.MAX_MOVES
+DIRECTIONS, EXTRA_SHIFTS = _default.DIRECTIONS, _default.EXTRA_SHIFTS
+del _default
@@ -0,0 +1,164 @@
+""" Opening book: the best reply of every position of the first plies, found offline by a deeper search.
+
+Positions are reduced to one of their 8 symmetric forms before being hashed, so that the book stores a single entry
+for the up to 8 symmetric positions and the square of this entry is mapped back on lookup. The book file keeps
+the sorted Zobrist keys and squares only, a lookup is a binary search. Every board size has its own book file.
+
+    python -m iothello.book --plies 8 --depth 6 --jobs 4
+    python -m iothello.book --size 8         # needs the 8x8 weights
+"""
+import argparse
+import os
+from multiprocessing import Pool, cpu_count
+
+import numpy as np
+
+from iothello.bitboard import SIZE, board_geometry, iter_squares, relative, absolute, popcount
+from iothello.symmetry import symmetries
+from iothello.transposition import zobrist_function
+from iothello.weights import model_path
+
+
+def book_file(size=None):
+    return model_path('book', 'npz', size)
+
+
+BOOK_FILE = book_file()
+
+
+def book_key(white, black, player, size=SIZE):
+    """ (key of the canonical form, symmetry moving the board to it) """
+    white, black, symmetry = symmetries(size).canonical(white, black)
+    return zobrist_function(size)(white, black, player), symmetry
+
+
+class OpeningBook:
+    """ keys: sorted uint64 array, squares: square of every key in the canonical form, plies: moves covered,
+    size: of the board """
+
+    def __init__(self, keys, squares, plies, size=SIZE):
+        self.keys = keys
+        self.squares = squares
+        self.plies = plies
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, white, black, player):
+        """ The book square for `player` or None """
+        if popcount(white | black) - 4 >= self.plies:
+            return None
+        key, symmetry = book_key(white, black, player, self.size)
+        index = int(np.searchsorted(self.keys, np.uint64(key)))
+        if index == len(self.keys) or int(self.keys[index]) != key:
+            self.misses += 1
+            return None
+        tables = symmetries(self.size)
+        square = tables.SQUARE_MAPS[tables.INVERSES[symmetry]][int(self.squares[index])]
+        own, opp = relative(white, black, player)
+        # a Zobrist collision could give a square which isn't legal here
+        if not board_geometry(self.size).legal_moves(own, opp) >> square & 1:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return square
+
+    def save(self, filename=BOOK_FILE):
+        np.savez(filename, keys=self.keys, squares=self.squares, plies=self.plies, size=self.size)
+
+    @classmethod
+    def load(cls, filename=BOOK_FILE):
+        with np.load(filename) as data:
+            return cls(data['keys'], data['squares'], int(data['plies']), int(data['size']))
+
+    @classmethod
+    def from_entries(cls, entries, plies, size=SIZE):
+        """ entries: {key: canonical square} """
+        keys = np.array(sorted(entries), dtype=np.uint64)
+        squares = np.array([entries[key] for key in keys.tolist()], dtype=np.uint8)
+        return cls(keys, squares, plies, size)
+
+
+def exists(filename=BOOK_FILE):
+    return os.path.exists(filename)
+
+
+def book_positions(plies, size=SIZE):
+    """ Canonical (white, black, player) of every position of the board of `size` reachable in fewer than `plies`
+    moves """
+    geometry = board_geometry(size)
+    legal_moves, play, canonical = geometry.legal_moves, geometry.play, symmetries(size).canonical
+    positions = []
+    seen = set()
+    layer = [(geometry.START_WHITE, geometry.START_BLACK, 1)]
+    for _ in range(plies):
+        next_layer = []
+        for white, black, player in layer:
+            own, opp = relative(white, black, player)
+            moves = legal_moves(own, opp)
+            if moves == 0:
+                player = -player
+                own, opp = opp, own
+                moves = legal_moves(own, opp)
+                if moves == 0:
+                    continue
+            key = book_key(white, black, player, size)[0]
+            if key in seen:
+                continue
+            seen.add(key)
+            positions.append(canonical(white, black)[:2] + (player,))
+            next_layer.extend(absolute(*play(own, opp, square), player) + (-player,) for square in iter_squares(moves))
+        layer = next_layer
+    return positions
+
+
+_engine = None
+
+
+def init_worker(size):
+    global _engine
+    from iothello.core import Engine
+    _engine = Engine(size)
+    _engine.load_engine()
+    if _engine.evaluator is None:
+        raise ValueError(f'The {size}x{size} book needs the weights of its models')
+
+
+def search_position(task):
+    """ (key, canonical square) of the best move found by a search of `depth` """
+    from iothello.search import Search
+    white, black, player, depth = task
+    search = Search(_engine.evaluator, depth, table=_engine.table, geometry=_engine.geometry)
+    square = search.best_move(*relative(white, black, player), player)
+    return _engine.zobrist(white, black, player), square
+
+
+def build_book(plies=8, depth=6, n_jobs=cpu_count() - 2, filename=None, size=SIZE):
+    """ Searches every position of the first `plies` moves to `depth` plies and saves the book to `filename`, the
+    book file of `size` when None """
+    from tqdm import tqdm
+    tasks = [position + (depth,) for position in book_positions(plies, size)]
+    progress = dict(total=len(tasks), desc='Searching the book positions... ', unit='positions', mininterval=1)
+    if n_jobs <= 1:
+        init_worker(size)
+        results = [search_position(task) for task in tqdm(tasks, **progress)]
+    else:
+        with Pool(n_jobs, initializer=init_worker, initargs=(size,)) as pool:
+            results = list(tqdm(pool.imap_unordered(search_position, tasks, chunksize=16), **progress))
+    book = OpeningBook.from_entries(dict(results), plies, size)
+    book.save(book_file(size) if filename is None else filename)
+    return book
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--plies', type=int, default=8, help='number of moves covered by the book')
+    parser.add_argument('--depth', type=int, default=6, help='depth of the search of every position')
+    parser.add_argument('--jobs', type=int, default=cpu_count() - 2)
+    parser.add_argument('--size', type=int, default=SIZE, help='of the board')
+    parser.add_argument('--output', help='the book file of the size by default')
+    args = parser.parse_args()
+    print(f'{len(build_book(args.plies, args.depth, args.jobs, args.output, args.size))} positions')
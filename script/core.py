@@ -0,0 +1,209 @@
+""" The engine shared by research.Othello and backend_gui.Othello.
+
+Position stores a board as two bitboards, Engine finds the moves of the bots on it. Both front ends only convert
+their coordinates and call into here, so that every improvement of the engine lands in both of them.
+"""
+import warnings
+
+import numpy as np
+
+from iothello import book, weights
+from iothello.bitboard import board_geometry, iter_squares, relative, absolute, popcount
+from iothello.endgame import EndgameSolver, ENDGAME_EMPTIES
+from iothello.evaluation import Evaluator, score_bitboards
+from iothello.instrumentation import NULL_PROBE
+from iothello.search import Search
+from iothello.transposition import TranspositionTable, EXACT, zobrist_function
+
+
+class Position:
+    """ A board as two bitboards, 1 is white and -1 is black, on the bitboard.Geometry `geometry`, of the default
+    size when None; the start position unless white and black are given """
+    __slots__ = ('white', 'black', 'geometry')
+
+    def __init__(self, white=None, black=None, geometry=None):
+        self.geometry = geometry = geometry or board_geometry()
+        self.white = geometry.START_WHITE if white is None else white
+        self.black = geometry.START_BLACK if black is None else black
+
+    @classmethod
+    def from_board(cls, board, offset=0, geometry=None):
+        """ board indexed as board[row + offset][col + offset], SIZE x SIZE with offset 0 or padded with offset 1 """
+        geometry = geometry or board_geometry()
+        return cls(*geometry.pack(board, offset), geometry)
+
+    def to_board(self):
+        """ (SIZE, SIZE) int8 array """
+        size = self.geometry.SIZE
+        return self.geometry.unpack(self.white, self.black).reshape(size, size)
+
+    def copy(self):
+        return Position(self.white, self.black, self.geometry)
+
+    def relative(self, player):
+        return relative(self.white, self.black, player)
+
+    def moves(self, player):
+        """ Mask of the legal moves of `player` """
+        return self.geometry.legal_moves(*self.relative(player))
+
+    def squares(self, player):
+        return tuple(iter_squares(self.moves(player)))
+
+    def play(self, square, player):
+        """ Plays `square` for `player` in place, returns the mask of the flipped pieces """
+        own, opp = self.relative(player)
+        flipped = self.geometry.flips(own, opp, square)
+        self.white, self.black = absolute(own | flipped | (1 << square), opp & ~flipped, player)
+        return flipped
+
+    def empties(self):
+        return popcount(self.geometry.FULL & ~(self.white | self.black))
+
+    def score(self):
+        """ Sum of the board, positive when white has more pieces """
+        return popcount(self.white) - popcount(self.black)
+
+    def __eq__(self, other):
+        return (isinstance(other, Position) and self.white == other.white and self.black == other.black
+                and self.geometry is other.geometry)
+
+    def __hash__(self):
+        return hash((self.white, self.black))
+
+    def __repr__(self):
+        return f'Position(white={self.white:#x}, black={self.black:#x})'
+
+
+def replies(own, opp, geometry):
+    """ Boards (own, opp) after the reply of the opponent; if it has to pass, after the next move of `own`,
+    and if neither can move the board itself, as Othello.next_layer does """
+    legal_moves, play = geometry.legal_moves, geometry.play
+    moves = legal_moves(opp, own)
+    if moves:
+        return [play(opp, own, square)[::-1] for square in iter_squares(moves)]
+    moves = legal_moves(own, opp)
+    if moves:
+        return [play(own, opp, square) for square in iter_squares(moves)]
+    return [(own, opp)]
+
+
+class Engine:
+    """ Models, caches and move choice of the bot, for any player, on boards of `size`: the default size when None.
+
+    Without weights for the size, the model and search bots play the move of best_move_simple, except in the
+    endgame which the solver plays exactly.
+    """
+
+    def __init__(self, size=None):
+        self.geometry = board_geometry(size)
+        self.zobrist = zobrist_function(self.geometry.SIZE)
+        self.models = None
+        self.evaluator = None
+        self.book = None
+        self.table = TranspositionTable()
+        self.endgame = EndgameSolver(self.geometry)
+        self.endgame_empties = ENDGAME_EMPTIES
+        # instrumentation.Stats to record every decision
+        self.stats = None
+
+    def load_engine(self):
+        size = self.geometry.SIZE
+        if self.models is None:
+            filename = weights.weights_file(size)
+            if weights.exists(filename):
+                models = weights.load_models(filename)
+                self.evaluator = Evaluator(models)
+                self.models = models
+            else:
+                warnings.warn(f'No weights for the {size}x{size} board in {filename}, the bots play the move flipping '
+                              f'the most pieces out of the endgame', RuntimeWarning)
+        if self.book is None and book.exists(book.book_file(size)):
+            self.book = book.OpeningBook.load(book.book_file(size))
+
+    def probe(self, position, move_number=None):
+        if self.stats is None:
+            return NULL_PROBE
+        return self.stats.probe(popcount(position.white | position.black) - 4 if move_number is None else move_number)
+
+    def book_move(self, position, player=-1):
+        """ The square of the opening book for `player`, None out of the book """
+        if self.book is None:
+            return None
+        return self.book.lookup(position.white, position.black, player)
+
+    def best_move_simple(self, position, player=-1):
+        """ The move which leaves `player` with the most pieces """
+        probe = self.probe(position)
+        own, opp = position.relative(player)
+        flips = self.geometry.flips
+        moves = self.geometry.legal_moves(own, opp)
+        square = max(iter_squares(moves), key=lambda square: popcount(flips(own, opp, square)))
+        probe.done('simple', branching=popcount(moves))
+        return square
+
+    def best_move_model(self, position, move_number, player=-1):
+        """ Book move in the opening, then minimax of depth 2 over the model scores, depth 1 for the last 2 moves,
+        exact in the endgame """
+        self.load_engine()
+        probe = self.probe(position, move_number)
+        square = self.book_move(position, player)
+        if square is not None:
+            probe.done('book')
+            return square
+        own, opp = position.relative(player)
+        if position.empties() <= self.endgame_empties:
+            square = self.endgame.best_move(own, opp)[0]
+            probe.done('endgame', nodes=self.endgame.nodes)
+            return square
+        if self.models is None:
+            return self.best_move_simple(position, player)
+        geometry = self.geometry
+        depth = 2 if move_number < geometry.MAX_MOVES - 2 else 1
+        key = self.zobrist(position.white, position.black, player)
+        entry = self.table.probe(key)
+        if entry is not None and entry[0] >= depth and entry[2] == EXACT and entry[3] is not None:
+            probe.done('table')
+            return entry[3]
+        squares = list(iter_squares(geometry.legal_moves(own, opp)))
+        children = [geometry.play(own, opp, square) for square in squares]
+        if depth == 2:
+            layers = [replies(child_own, child_opp, geometry) for child_own, child_opp in children]
+        else:
+            layers = [[child] for child in children]
+        leaves = [absolute(leaf_own, leaf_opp, player) for layer in layers for leaf_own, leaf_opp in layer]
+        whites, blacks = zip(*leaves)
+        probe.lap('expand')
+        # every leaf is scored in one batch, then the worst score for `player` is taken among the replies of each move
+        model = self.models[min(move_number + depth, len(self.models) - 1)]
+        scores = player * score_bitboards(model, whites, blacks)
+        probe.lap('score')
+        offsets = np.cumsum([0] + [len(layer) for layer in layers[:-1]])
+        values = np.minimum.reduceat(scores, offsets)
+        best = int(values.argmax())
+        self.table.store(key, depth, float(values[best]), EXACT, squares[best])
+        probe.lap('select')
+        probe.done('model', branching=len(squares), nodes=1 + len(children) + (len(leaves) if depth == 2 else 0),
+                   leaves=len(leaves))
+        return squares[best]
+
+    def best_move_search(self, position, depth=4, time_ms=None, player=-1, stop=None):
+        """ Book move in the opening, else alpha-beta search to `depth` plies within `time_ms`, or until the
+        threading.Event `stop` is set """
+        self.load_engine()
+        probe = self.probe(position)
+        square = self.book_move(position, player)
+        if square is not None:
+            probe.done('book')
+            return square
+        if self.evaluator is None and position.empties() > self.endgame_empties:
+            return self.best_move_simple(position, player)
+        own, opp = position.relative(player)
+        hits = self.table.hits
+        search = Search(self.evaluator, depth, time_ms, table=self.table, endgame_empties=self.endgame_empties,
+                        stop=stop, geometry=self.geometry)
+        square = search.best_move(own, opp, player)
+        probe.lap('search')
+        probe.done('search', branching=popcount(self.geometry.legal_moves(own, opp)), nodes=search.nodes,
+                   leaves=search.leaves, table_hits=self.table.hits - hits, depth=search.completed_depth)
+        return square
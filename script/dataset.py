@@ -0,0 +1,68 @@
+""" Self-play datasets stored as binary shards.
+
+Every shard is a pair of .npy files: {name}_X.npy with the int8 boards X[move, simulation, SQUARES] and {name}_y.npy
+with the final sums. Shards are generated in parallel with independent seeds and loaded memory-mapped, so a dataset
+doesn't have to fit in RAM and is never parsed from text. A directory holds the games of a single board size.
+"""
+import os
+from glob import glob
+from multiprocessing import cpu_count
+from os.path import join
+
+import numpy as np
+
+from iothello.bitboard import board_geometry
+from iothello.simulation import random_games
+
+
+def write_shard(task):
+    directory, index, simulations, seed, size = task
+    X, y = random_games(simulations, seed=seed, size=size)
+    name = join(directory, f'shard_{index:05d}')
+    # written under a temporary name first, a half-written shard is never picked up by load_shards
+    np.save(f'{name}_X.tmp.npy', X)
+    np.save(f'{name}_y.tmp.npy', y)
+    os.replace(f'{name}_X.tmp.npy', f'{name}_X.npy')
+    os.replace(f'{name}_y.tmp.npy', f'{name}_y.npy')
+    return simulations
+
+
+def generate_shards(simulations, directory='data', shard_size=100000, n_jobs=cpu_count() - 2, seed=None, size=None):
+    """ Plays `simulations` random games on the board of `size` split in shards of `shard_size` games over a pool of
+    `n_jobs` processes. New shards are added after the ones already in `directory`, every shard gets its own seed
+    derived from `seed`. """
+    from tqdm.contrib.concurrent import process_map
+    os.makedirs(directory, exist_ok=True)
+    start = len(shard_names(directory))
+    root = np.random.SeedSequence(seed)
+    tasks = []
+    for n, offset in enumerate(range(0, simulations, shard_size)):
+        shard_seed = np.random.SeedSequence(root.entropy, spawn_key=(start + n,))
+        tasks.append((directory, start + n, min(shard_size, simulations - offset), shard_seed, size))
+    process_map(write_shard, tasks, max_workers=max(n_jobs, 1), chunksize=1, unit='shards', desc='Writing shards... ')
+
+
+def shard_names(directory):
+    return sorted(path[:-len('_X.npy')] for path in glob(join(directory, 'shard_*_X.npy')) if '.tmp' not in path)
+
+
+def load_shards(directory='data'):
+    """ Returns the list of memory-mapped (X, y) of the shards in `directory` """
+    return [(np.load(f'{name}_X.npy', mmap_mode='r'), np.load(f'{name}_y.npy', mmap_mode='r'))
+            for name in shard_names(directory)]
+
+
+def iter_move(directory, move):
+    """ Yields (X, y) of every shard for a single move, leaving out the games already over at that move """
+    for X, y in load_shards(directory):
+        X_move = np.asarray(X[move])
+        played = np.count_nonzero(X_move, axis=1) > 0
+        yield X_move[played], np.asarray(y)[played]
+
+
+def load_move(directory, move, size=None):
+    """ All the (X, y) of a move, concatenated; `size` only gives the shape of X when there are no games """
+    chunks = list(iter_move(directory, move))
+    if not chunks:
+        return np.zeros((0, board_geometry(size).SQUARES), dtype=np.int8), np.zeros(0, dtype=np.int8)
+    return np.concatenate([X for X, _ in chunks]), np.concatenate([y for _, y in chunks])
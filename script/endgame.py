@@ -0,0 +1,109 @@
+""" Exact endgame solver for the last empty squares.
+
+It has its own move generation: with few empties it's cheaper to try the flips of every empty square than to
+compute the legal moves mask. Empties are visited by parity, the regions with an odd number of empties first,
+and with a (-1, 1) null window the solver only proves win, draw or loss.
+"""
+from iothello.bitboard import board_geometry, iter_squares, popcount
+
+ENDGAME_EMPTIES = 10
+FASTEST_FIRST_EMPTIES = 6
+
+
+def regions(size):
+    """ The board split in 4 quadrants, 3x3 squares on 6x6, parity is tracked per region """
+    halves = (range(0, size // 2), range(size // 2, size))
+    return tuple(sum(1 << (row * size + col) for row in rows for col in cols) for rows in halves for cols in halves)
+
+
+def corners(size):
+    return (1 << 0) | (1 << (size - 1)) | (1 << (size * (size - 1))) | (1 << (size * size - 1))
+
+
+class EndgameSolver:
+    """ geometry: bitboard.Geometry of the positions to solve, of the default size when None """
+
+    def __init__(self, geometry=None):
+        geometry = geometry or board_geometry()
+        self.full = geometry.FULL
+        self.flips = geometry.flips
+        self.legal_moves = geometry.legal_moves
+        self.regions = regions(geometry.SIZE)
+        self.corners = corners(geometry.SIZE)
+        # below the worst final disc difference
+        self.lowest = -geometry.SQUARES - 1
+        self.nodes = 0
+
+    def best_move(self, own, opp, wld=False):
+        """ Returns (square, score) of the best move for the owner of `own`, the score being the exact final
+        disc difference, or only its sign when wld is True. The square is None if the player has to pass. """
+        self.nodes = 0
+        alpha, beta = (-1, 1) if wld else (self.lowest, -self.lowest)
+        best_square, best = None, self.lowest
+        for square, child_opp, child_own in self.children(own, opp, True):
+            score = -self.solve(child_opp, child_own, -beta, -max(alpha, best))
+            if score > best:
+                best_square, best = square, score
+                if best >= beta:
+                    break
+        return best_square, best
+
+    def solve(self, own, opp, alpha, beta, passed=False):
+        """ Final disc difference for the owner of `own` with both players playing perfectly, within (alpha, beta) """
+        self.nodes += 1
+        empties = self.full & ~(own | opp)
+        if empties & (empties - 1) == 0:
+            return self.solve_last(own, opp, empties)
+        best = lowest = self.lowest
+        for _, child_opp, child_own in self.children(own, opp, popcount(empties) > FASTEST_FIRST_EMPTIES):
+            score = -self.solve(child_opp, child_own, -beta, -alpha)
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        if best == lowest:
+            if passed:
+                return popcount(own) - popcount(opp)
+            return -self.solve(opp, own, -beta, -alpha, True)
+        return best
+
+    def solve_last(self, own, opp, empty):
+        """ Score when at most one square is empty, no need to search """
+        if empty:
+            flips = self.flips
+            square = empty.bit_length() - 1
+            flipped = flips(own, opp, square)
+            if flipped:
+                return popcount(own) - popcount(opp) + 2 * popcount(flipped) + 1
+            flipped = flips(opp, own, square)
+            if flipped:
+                return popcount(own) - popcount(opp) - 2 * popcount(flipped) - 1
+        return popcount(own) - popcount(opp)
+
+    def children(self, own, opp, fastest_first=False):
+        """ (square, opp, own) after every legal move, in parity order or, far from the end where it pays for itself,
+        sorted by the mobility left to the opponent """
+        flips = self.flips
+        children = []
+        for square in self.order(own, opp):
+            flipped = flips(own, opp, square)
+            if flipped:
+                children.append((square, opp & ~flipped, own | flipped | (1 << square)))
+        if fastest_first:
+            legal_moves = self.legal_moves
+            children.sort(key=lambda child: popcount(legal_moves(child[1], child[2])))
+        return children
+
+    def order(self, own, opp):
+        """ Empty squares, the ones in regions with an odd number of empties and the corners first """
+        empties = self.full & ~(own | opp)
+        odd = 0
+        for region in self.regions:
+            if popcount(empties & region) & 1:
+                odd |= region
+        first = empties & odd
+        corners = self.corners
+        return (list(iter_squares(first & corners)) + list(iter_squares(first & ~corners))
+                + list(iter_squares(empties & ~odd & corners)) + list(iter_squares(empties & ~odd & ~corners)))
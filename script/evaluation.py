@@ -0,0 +1,81 @@
+""" Vectorized scoring of boards with the per-move Ridge models. """
+import numpy as np
+
+from iothello.bitboard import KERNELS, popcount, unpack_bits
+
+
+def predict(model, boards):
+    """ Scores a (N, SQUARES) batch of boards as a single matrix-vector product, skipping sklearn's validation. """
+    return boards @ model.coef_ + model.intercept_
+
+
+def score_bitboards(model, whites, blacks):
+    """ predict of the boards (whites[i], blacks[i]), of as many squares as the model has weights """
+    squares = len(model.coef_)
+    return predict(model, unpack_bits(whites, squares).view(np.int8) - unpack_bits(blacks, squares).view(np.int8))
+
+
+python_score_bitboards = score_bitboards
+if KERNELS:
+    from iothello import kernels
+    if kernels.ENABLED:
+        score_bitboards = kernels.score_bitboards
+
+
+class Evaluator:
+    """ Scores single bitboard positions from white's point of view.
+
+    The model of a position is picked by its number of moves played, i.e. its pieces minus the 4 of the start,
+    as find_best_move_model does with move_number + depth. Every model is turned into byte lookup tables
+    the first time it is used, so a position is scored with 10 lookups instead of a dot product.
+
+    Since the models are linear, a move changes the score by the weights of the played and flipped squares only:
+    delta gives this change, so that a search can carry the score of its leaves along instead of rescoring them.
+    """
+
+    def __init__(self, models):
+        self.models = models
+        self.tables = [None] * len(models)
+        self.weights = [None] * len(models)
+
+    def model_index(self, white, black):
+        return self.pieces_index(popcount(white | black))
+
+    def pieces_index(self, pieces):
+        return min(max(pieces - 4, 0), len(self.models) - 1)
+
+    def build_tables(self, index):
+        squares = len(self.models[index].coef_)
+        chunks = (squares + 7) // 8
+        coef = np.zeros(chunks * 8)
+        coef[:squares] = self.models[index].coef_
+        bits = (np.arange(256)[:, None] >> np.arange(8)) & 1
+        tables = [(bits @ coef[8 * chunk:8 * chunk + 8]).tolist() for chunk in range(chunks)]
+        self.tables[index] = (float(self.models[index].intercept_), tables)
+        self.weights[index] = np.asarray(self.models[index].coef_, dtype=np.float64).tolist()
+        return self.tables[index]
+
+    def __call__(self, white, black):
+        return self.score(self.model_index(white, black), white, black)
+
+    def score(self, index, white, black):
+        """ Score by the model `index`, whatever the number of pieces """
+        intercept, tables = self.tables[index] or self.build_tables(index)
+        score = intercept
+        for table in tables:
+            score += table[white & 255] - table[black & 255]
+            white >>= 8
+            black >>= 8
+        return score
+
+    def delta(self, index, square, flipped):
+        """ Change of the score of the model `index` when white plays on `square` and flips `flipped`, the opposite
+        when black does: the square goes from 0 to 1 and every flipped piece from -1 to 1 """
+        tables = (self.tables[index] or self.build_tables(index))[1]
+        total = 0.0
+        chunk = 0
+        while flipped:
+            total += tables[chunk][flipped & 255]
+            flipped >>= 8
+            chunk += 1
+        return self.weights[index][square] + 2 * total
@@ -2,25 +2,86 @@ from os import environ
 environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
 
 from os.path import join, dirname
-import numpy as np
 import pygame as pg
+from queue import Queue
 from sys import exit
-from time import sleep
+from threading import Thread, Event
+from time import perf_counter
 
 from iothello.backend_gui import Othello
+from iothello.bitboard import iter_squares
+
+
+class Job:
+    """ A move of the bot to find on `position`; a ponder job first guesses the move of the human on it.
+    error is the exception raised while thinking, if any """
+
+    def __init__(self, position, move_count, ponder=False):
+        self.position = position
+        self.move_count = move_count
+        self.ponder = ponder
+        self.square = None
+        self.error = None
+        self.stop = Event()
+        self.guessed = Event()
+        self.done = Event()
+
+
+class Thinker:
+    """ Finds the moves of the bot on a background thread, so that the window keeps responding meanwhile.
+
+    Jobs run one at a time in the order they are submitted, which keeps the tables of the engine to a single thread.
+    A job whose stop is set is skipped, or ends early if it is searching; its result is just never used.
+    """
+
+    def __init__(self, gui):
+        self.gui = gui
+        self.jobs = Queue()
+        Thread(target=self.run, daemon=True).start()
+
+    def submit(self, position, move_count, ponder=False):
+        job = Job(position.copy(), move_count, ponder)
+        self.jobs.put(job)
+        return job
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            try:
+                if job.ponder and not job.stop.is_set():
+                    job.position.play(self.gui.best_move_model(job.position, job.move_count, player=1), 1)
+                    job.move_count += 1
+                job.guessed.set()
+                if not job.stop.is_set() and job.position.moves(-1):
+                    job.square = self.gui.bot_move(job.position, job.move_count, job.stop)
+            except Exception as error:
+                # the thread keeps serving the next jobs, the error is raised again by wait_for_bot
+                job.error = error
+            finally:
+                job.guessed.set()
+                job.done.set()
 
 
 class Gui(Othello):
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, search_depth=None, search_time_ms=None, ponder=True, size=None):
+        """ search_depth: the bot searches this deep instead of playing find_best_move_model
+        ponder: the bot guesses the move of the human and thinks about its reply while the human is playing
+        size: of the board, the default one when None """
+        super().__init__(size)
+        # the menu shows up while the models are loaded
+        Thread(target=self.load_engine, daemon=True).start()
+        self.thinker = Thinker(self)
+        self.search_depth = search_depth
+        self.search_time_ms = search_time_ms
+        self.ponder = ponder
         pg.init()
         self.clock = pg.time.Clock()
         self.FR = 60
         self.clock.tick(self.FR)
-        self.ROWS, self.COLS = 6, 6
-        self.SQUARE_SIZE = 100
-        self.SCREEN_SIZE = (600, 600)
+        self.ROWS, self.COLS = self.geometry.SIZE, self.geometry.SIZE
+        self.SQUARE_SIZE = 600 // self.ROWS
+        self.SCREEN_SIZE = (self.SQUARE_SIZE * self.COLS, self.SQUARE_SIZE * self.ROWS)
         self.RED = (255, 0, 0)
         self.WHITE = (255, 255, 255)
         self.BLACK = (0, 0, 0)
@@ -93,63 +154,128 @@ class Gui(Othello):
             return self.BLACK
 
     def draw_piece(self):
+        board = self.board
         for row in range(self.ROWS):
             for col in range(self.COLS):
-                if self.board[row, col] != 0:
-                    pg.draw.circle(self.screen, self.find_player_color(self.board[row][col]),
-                                   (int(col * self.SQUARE_SIZE + self.SQUARE_SIZE // 2), int(row * self.SQUARE_SIZE + self.SQUARE_SIZE // 2)),
-                                   int(self.SQUARE_SIZE * 0.4))
+                if board[row, col] != 0:
+                    self.draw_disc(row, col, board[row, col])
+
+    def draw_disc(self, row, col, player):
+        pg.draw.circle(self.screen, self.find_player_color(player),
+                       (int(col * self.SQUARE_SIZE + self.SQUARE_SIZE // 2), int(row * self.SQUARE_SIZE + self.SQUARE_SIZE // 2)),
+                       int(self.SQUARE_SIZE * 0.4))
+
+    def draw_square(self, square):
+        """ Draws again a single square with its piece, returns its rect """
+        row, col = divmod(square, self.COLS)
+        rect = (col * self.SQUARE_SIZE, row * self.SQUARE_SIZE, self.SQUARE_SIZE, self.SQUARE_SIZE)
+        pg.draw.rect(self.screen, self.GREEN2 if (row + col) % 2 == 0 else self.GREEN1, rect)
+        if self.position.white >> square & 1:
+            self.draw_disc(row, col, 1)
+        elif self.position.black >> square & 1:
+            self.draw_disc(row, col, -1)
+        return rect
+
+    def repaint(self, before):
+        """ Updates on screen the squares which changed since the position `before` """
+        changed = (before.white ^ self.position.white) | (before.black ^ self.position.black)
+        pg.display.update([self.draw_square(square) for square in iter_squares(changed)])
 
     def text_format(self, message, textSize, textColor):
         newFont = pg.font.Font(self.font, textSize)
         newText = newFont.render(message, 0, textColor)
         return newText
 
+    def bot_move(self, position, move_count, stop=None):
+        if self.search_depth is not None:
+            return self.best_move_search(position, self.search_depth, self.search_time_ms, stop=stop)
+        elif move_count == self.geometry.MAX_MOVES - 1:
+            return self.best_move_simple(position)
+        else:
+            return self.best_move_model(position, move_count)
+
+    def wait_for_human(self, moves):
+        while True:
+            for event in pg.event.get():
+                if event.type == pg.QUIT:
+                    pg.quit()
+                    exit()
+                elif event.type == pg.MOUSEBUTTONDOWN:
+                    mousex, mousey = event.pos
+                    move = (mousey // self.SQUARE_SIZE, mousex // self.SQUARE_SIZE)
+                    if move in moves:
+                        return move
+            self.clock.tick(self.FR)
+
+    def keep_alive(self, job, event, seconds=0.0):
+        """ Keeps the window alive until `event` of the job is set, and at least `seconds` """
+        start = perf_counter()
+        while not event.is_set() or perf_counter() - start < seconds:
+            for window_event in pg.event.get():
+                if window_event.type == pg.QUIT:
+                    job.stop.set()
+                    pg.quit()
+                    exit()
+            self.clock.tick(self.FR)
+
+    def wait_for_bot(self, job):
+        """ Keeps the window alive until the job is over, and at least 0.3 s so that the move can be followed;
+        raises the error of the job if the bot failed """
+        pg.display.set_caption('OTHELLO - thinking...')
+        self.keep_alive(job, job.done, 0.3)
+        pg.display.set_caption('OTHELLO')
+        if job.error is not None:
+            raise RuntimeError('The bot failed to find its move') from job.error
+        return divmod(job.square, self.COLS)
+
     def play(self):
         player = 1
         move_count = 0
+        pondering = None
         self.draw_squares()
         self.draw_piece()
+        pg.display.update()
 
         while True:
-            pg.display.update()
-
             moves = self.find_possible_moves(player)
             if len(moves) == 0:
                 player = -player
                 moves = self.find_possible_moves(player)
                 if len(moves) == 0:
+                    if pondering is not None:
+                        pondering.stop.set()
                     pg.time.delay(3000)
-                    self.score = np.sum(self.board)
+                    self.score = self.position.score()
                     self.reset_board()
                     self.end_game = True
-                    self.main_menu()
+                    return
 
+            before = self.position.copy()
             if player == 1:
-                while True:
-                    event = pg.event.wait()
-                    if event.type == pg.QUIT:
-                        pg.quit()
-                        exit()
-                    elif event.type == pg.MOUSEBUTTONDOWN:
-                        mousex, mousey = event.pos
-                        move = (mousey // self.SQUARE_SIZE, mousex // self.SQUARE_SIZE)
-                        if move in moves:
-                            self.update_board(move, 1)
-                            break
-
-            elif player == -1:
-                sleep(0.3)
-                if move_count == 31:
-                    move = self.find_best_move_simple()
-                else:
-                    move = self.find_best_move_model(move_count)
-                self.update_board(move, -1)
+                if self.ponder:
+                    if pondering is not None:
+                        pondering.stop.set()
+                    pondering = self.thinker.submit(self.position, move_count, ponder=True)
+                move = self.wait_for_human(moves)
+            else:
+                job = None
+                if pondering is not None:
+                    # the guess is quick, the reply is kept only if the human played the guessed move
+                    self.keep_alive(pondering, pondering.guessed)
+                    if pondering.position == self.position and pondering.move_count == move_count:
+                        job = pondering
+                    else:
+                        pondering.stop.set()
+                    pondering = None
+                if job is None:
+                    job = self.thinker.submit(self.position, move_count)
+                move = self.wait_for_bot(job)
+            self.update_board(move, player)
+            self.repaint(before)
 
             move_count += 1
-            self.draw_piece()
             player = -player
 
 
-def play():
-    Gui().main_menu()
\ No newline at end of file
+def play(size=None):
+    Gui(size=size).main_menu()
\ No newline at end of file
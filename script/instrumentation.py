@@ -0,0 +1,118 @@
+""" Counters and timings of the move decisions of an Engine, and a cProfile hook.
+
+Nothing is measured unless Engine.stats is set to a Stats: the engine then opens a Probe per decision, which times
+its phases and records its counters (nodes, leaves, table hits, ...) as one entry of Stats.moves. When it isn't set
+the engine gets NULL_PROBE, whose methods do nothing, so the cost is a few calls per decision and none per node.
+
+    engine.stats = Stats()
+    ...play a game...
+    engine.stats.moves[-1]       # the last decision
+    engine.stats.summary()       # the game
+    merge(summaries)             # many games, e.g. the records of tournament --stats
+"""
+import cProfile
+import pstats
+import sys
+from collections import Counter, defaultdict
+from time import perf_counter
+
+
+class Probe:
+    """ Phases and counters of a single decision """
+    __slots__ = ('stats', 'move_number', 'start', 'last', 'phases')
+
+    def __init__(self, stats, move_number):
+        self.stats = stats
+        self.move_number = move_number
+        self.start = self.last = perf_counter()
+        self.phases = {}
+
+    def lap(self, phase):
+        """ Time since the previous lap, or the start, is spent in `phase` """
+        now = perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - self.last
+        self.last = now
+
+    def done(self, method, **counters):
+        """ Records the decision, `method` tells how it was taken: 'book', 'model', 'search', ... """
+        self.stats.moves.append({'move_number': self.move_number, 'method': method,
+                                 'seconds': perf_counter() - self.start, 'phases': self.phases, **counters})
+
+
+class NullProbe:
+    __slots__ = ()
+
+    def lap(self, phase):
+        pass
+
+    def done(self, method, **counters):
+        pass
+
+
+NULL_PROBE = NullProbe()
+
+
+class Stats:
+    """ moves: a dict per decision; counters: calls of the research.Othello board functions """
+
+    def __init__(self):
+        self.moves = []
+        self.counters = Counter()
+
+    def probe(self, move_number):
+        return Probe(self, move_number)
+
+    def count(self, name, amount=1):
+        self.counters[name] += amount
+
+    def clear(self):
+        self.moves.clear()
+        self.counters.clear()
+
+    def summary(self):
+        """ Totals over the decisions, and the mean number of legal moves per move number """
+        totals = Counter()
+        phases = Counter()
+        methods = Counter()
+        branching = defaultdict(list)
+        for move in self.moves:
+            methods[move['method']] += 1
+            phases.update(move['phases'])
+            totals.update({key: value for key, value in move.items()
+                           if key not in ('move_number', 'method', 'phases', 'branching', 'depth')})
+            if 'branching' in move:
+                branching[move['move_number']].append(move['branching'])
+        return {'decisions': len(self.moves), 'methods': dict(methods), 'phases': dict(phases), 'totals': dict(totals),
+                'counters': dict(self.counters),
+                'branching': {number: (sum(values) / len(values), len(values))
+                              for number, values in sorted(branching.items())}}
+
+
+def merge(summaries):
+    """ One summary of many, e.g. of every game of a tournament """
+    merged = {'decisions': 0, 'methods': Counter(), 'phases': Counter(), 'totals': Counter(), 'counters': Counter()}
+    branching = defaultdict(lambda: [0.0, 0])
+    for summary in summaries:
+        merged['decisions'] += summary['decisions']
+        for key in ('methods', 'phases', 'totals', 'counters'):
+            merged[key].update(summary[key])
+        for number, (mean, count) in summary['branching'].items():
+            branching[int(number)][0] += mean * count
+            branching[int(number)][1] += count
+    merged = {key: dict(value) if isinstance(value, Counter) else value for key, value in merged.items()}
+    merged['branching'] = {number: (total / count, count) for number, (total, count) in sorted(branching.items())}
+    return merged
+
+
+def profile(function, filename=None, top=25, stream=sys.stderr):
+    """ Runs function() under cProfile, prints the `top` functions by cumulative time to `stream`, saves the
+    profile to `filename` for snakeviz or pstats if given, and returns the result of function() """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return function()
+    finally:
+        profiler.disable()
+        if filename is not None:
+            profiler.dump_stats(filename)
+        pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(top)
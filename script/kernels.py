@@ -0,0 +1,181 @@
+""" Numba kernels of the hot paths: legal moves, flips and the scoring of a batch of bitboards.
+
+They are off by default, importing Numba and loading the compiled kernels take about a second which the GUI would pay
+at startup for little. With the environment variable IOTHELLO_KERNELS=numba, every bitboard.Geometry and evaluation
+use them instead of their pure Python functions, which stay the reference; without Numba installed they fall back to
+them. Tournaments, book building, servers and benchmarks gain the most, the worker processes inherit the variable.
+The move kernels work on int64 so they stay off on the 8x8 board, whose bitboards need all 64 bits; score_bitboards
+works on uint64 and runs on every size.
+
+    IOTHELLO_KERNELS=numba python -m iothello.tournament model search-4 --games 1000
+    python -m iothello.kernels       # checks the kernels against the reference and times both
+    python -m pytest tests           # the same checks and the perft counts, skipped without Numba
+"""
+import json
+import warnings
+from functools import lru_cache
+from random import Random
+from time import perf_counter
+
+import numpy as np
+
+from iothello.bitboard import KERNELS, board_geometry, iter_squares, move_functions, play_function
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+ENABLED = njit is not None
+
+
+def supports(geometry):
+    """ Whether the kernels can run the bitboard.Geometry `geometry`: they work on int64, 8x8 needs all 64 bits """
+    return ENABLED and geometry.SQUARES < 64
+
+
+def install(geometry):
+    """ Replaces the move generation of `geometry` by the kernels, or warns why it can't """
+    if not supports(geometry):
+        if KERNELS:
+            reason = 'Numba is not installed' if njit is None else f'the {geometry.SQUARES} squares overflow int64'
+            warnings.warn(f'IOTHELLO_KERNELS=numba but {reason}, the pure Python functions are used', RuntimeWarning)
+        return
+    geometry.legal_moves, geometry.flips = compile_kernels(geometry.DIRECTIONS, geometry.FULL, geometry.EXTRA_SHIFTS)
+    geometry.play = play_function(geometry.flips)
+
+
+@lru_cache(maxsize=None)
+def compile_kernels(directions, full, extra_shifts):
+    """ (legal_moves, flips) compiled for the board of these masks, as bitboard.move_functions """
+    # the very same code as the reference
+    legal_moves = njit(cache=True)(move_functions(directions, full, extra_shifts)[0])
+
+    @njit(cache=True)
+    def flips(own, opp, square):
+        """ bitboard flips unrolled as legal_moves: the runs of opponent pieces next to the square, kept when an own
+        piece ends them """
+        move = 1 << square
+        flipped = 0
+        for direction, mask in directions:
+            flankable = opp & mask
+            x = (move << direction) & flankable
+            x |= (x << direction) & flankable
+            x |= (x << direction) & flankable
+            x |= (x << direction) & flankable
+            for _ in range(extra_shifts):
+                x |= (x << direction) & flankable
+            if (x << direction) & own:
+                flipped |= x
+            x = (move >> direction) & flankable
+            x |= (x >> direction) & flankable
+            x |= (x >> direction) & flankable
+            x |= (x >> direction) & flankable
+            for _ in range(extra_shifts):
+                x |= (x >> direction) & flankable
+            if (x >> direction) & own:
+                flipped |= x
+        return flipped
+
+    return legal_moves, flips
+
+
+if ENABLED:
+    @njit(cache=True)
+    def score_arrays(whites, blacks, coef, intercept):
+        scores = np.empty(len(whites))
+        for board in range(len(whites)):
+            white, black = whites[board], blacks[board]
+            score = intercept
+            for square in range(len(coef)):
+                score += coef[square] * (((white >> square) & 1) - ((black >> square) & 1))
+            scores[board] = score
+        return scores
+
+    def score_bitboards(model, whites, blacks):
+        """ evaluation.predict of the boards (whites[i], blacks[i]) without unpacking them, of any size """
+        return score_arrays(np.asarray(whites, dtype=np.uint64), np.asarray(blacks, dtype=np.uint64),
+                            np.ascontiguousarray(model.coef_, dtype=np.float64), float(model.intercept_))
+else:
+    score_bitboards = None
+
+
+def random_positions(count, seed=0, geometry=None):
+    """ (own, opp) of the positions of seeded random games on `geometry`, of the default size when None, for the
+    player to move """
+    geometry = geometry or board_geometry()
+    legal_moves, flips = geometry.python_legal_moves, geometry.python_flips
+    rng = Random(seed)
+    positions = []
+    while len(positions) < count:
+        own, opp = geometry.START_WHITE, geometry.START_BLACK
+        while True:
+            moves = list(iter_squares(legal_moves(own, opp)))
+            if not moves:
+                own, opp = opp, own
+                if not legal_moves(own, opp):
+                    break
+                continue
+            positions.append((own, opp))
+            square = rng.choice(moves)
+            flipped = flips(own, opp, square)
+            own, opp = opp & ~flipped, own | flipped | (1 << square)
+    return positions[:count]
+
+
+def check_parity(count=20000, seed=0, size=None):
+    """ Compares the kernels with the pure Python functions on the positions of random games of the geometry of `size`,
+    and on every square of them for flips, legal or not; raises RuntimeError on the first difference or when the
+    kernels can't run, returns the positions checked. tests/test_kernels.py runs the same comparisons under pytest. """
+    geometry = board_geometry(size)
+    if not supports(geometry):
+        raise RuntimeError(f"The kernels can't run the {geometry.SIZE}x{geometry.SIZE} geometry, "
+                           'there is nothing to compare')
+    legal_moves, flips = compile_kernels(geometry.DIRECTIONS, geometry.FULL, geometry.EXTRA_SHIFTS)
+    positions = random_positions(count, seed, geometry)
+    for own, opp in positions:
+        if legal_moves(own, opp) != geometry.python_legal_moves(own, opp):
+            raise RuntimeError(f'legal_moves differs on {(own, opp)}')
+        for square in range(geometry.SQUARES):
+            if not (own | opp) >> square & 1 and flips(own, opp, square) != geometry.python_flips(own, opp, square):
+                raise RuntimeError(f'flips differs on {(own, opp, square)}')
+    from iothello import weights
+    from iothello.evaluation import python_score_bitboards
+    filename = weights.weights_file(geometry.SIZE)
+    if weights.exists(filename):
+        whites, blacks = zip(*positions)
+        for index, model in enumerate(weights.load_models(filename)):
+            if not np.allclose(score_bitboards(model, whites, blacks), python_score_bitboards(model, whites, blacks),
+                               rtol=0, atol=1e-9):
+                raise RuntimeError(f'score_bitboards differs with the model {index}')
+    return len(positions)
+
+
+def timings(count=2000, seed=1, size=None):
+    """ Calls per second of the kernels and of the reference, the reference twice when the kernels can't run """
+    geometry = board_geometry(size)
+    if supports(geometry):
+        legal_moves, flips = compile_kernels(geometry.DIRECTIONS, geometry.FULL, geometry.EXTRA_SHIFTS)
+    else:
+        legal_moves, flips = geometry.python_legal_moves, geometry.python_flips
+    positions = random_positions(count, seed, geometry)
+    results = {}
+    for name, function in (('legal_moves', legal_moves), ('python_legal_moves', geometry.python_legal_moves),
+                           ('flips', flips), ('python_flips', geometry.python_flips)):
+        start = perf_counter()
+        if 'legal_moves' in name:
+            for own, opp in positions:
+                function(own, opp)
+        else:
+            for own, opp in positions:
+                for square in range(0, geometry.SQUARES, 6):
+                    function(own, opp, square)
+        calls = len(positions) * (1 if 'legal_moves' in name else len(range(0, geometry.SQUARES, 6)))
+        results[name] = calls / (perf_counter() - start)
+    return results
+
+
+if __name__ == '__main__':
+    main_geometry = board_geometry()
+    print(json.dumps({'enabled': supports(main_geometry),
+                      'checked_positions': check_parity() if supports(main_geometry) else 0, **timings()}, indent=2))
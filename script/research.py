@@ -1,50 +1,50 @@
-from os.path import join, dirname
+from os.path import join
 import os
 import warnings
-from itertools import chain
 from multiprocessing import cpu_count
 from random import choice
 
-import joblib
 import numpy as np
-from sklearn.linear_model import Ridge
-from tqdm import tqdm
-from tqdm.contrib.concurrent import process_map
+
+from iothello import weights
+from iothello.bitboard import iter_squares, relative, absolute, popcount
+from iothello.core import Engine, Position
+from iothello.dataset import generate_shards, load_move
+from iothello.simulation import random_games
+from iothello.symmetry import augment
+from iothello.tournament import play_tournament
+from iothello.training import accumulate
 
 warnings.simplefilter('ignore', UserWarning)
 
+# the 8 directions of the lines of a list board
+STEPS = tuple((xs, ys) for xs in (-1, 0, 1) for ys in (-1, 0, 1) if xs or ys)
+
+
+def to_coordinates(square, size):
+    return square // size + 1, square % size + 1
+
 
-class Othello:
+class Othello(Engine):
 
-    def __init__(self):
+    def __init__(self, size=None):
+        super().__init__(size)
         self.board = self.reset_board()
 
-        self.x_board = (1, 2, 3, 4, 5, 6)
-        self.y_board = (1, 2, 3, 4, 5, 6)
+        self.x_board = tuple(range(1, self.geometry.SIZE + 1))
+        self.y_board = tuple(range(1, self.geometry.SIZE + 1))
 
         self.x_square = (-1, 0, 1)
         self.y_square = (-1, 0, 1)
 
-        self.no_possible_moves = [False, False]
+        self.load_engine()
 
-        self.models = self.load_models()
-
-    @staticmethod
-    def load_models():
-        if os.path.exists('models'):
-            models = []
-            for move in range(32):
-                filename = join(dirname(__file__), 'models', f'{move}_ridge.sav')
-                models.append(joblib.load(filename))
-            return models
-        else:
-            return None
-
-    @staticmethod
-    def reset_board():
-        board = np.zeros((8, 8), dtype=np.int8)
-        board[[3, 4], [4, 3]] = 1
-        board[[4, 3], [4, 3]] = -1
+    def reset_board(self):
+        size = self.geometry.SIZE
+        center = size // 2
+        board = np.zeros((size + 2, size + 2), dtype=np.int8)
+        board[[center, center + 1], [center + 1, center]] = 1
+        board[[center + 1, center], [center + 1, center]] = -1
         board = board.tolist()
         return board
 
@@ -56,199 +56,176 @@ class Othello:
                     pieces.append((xb, yb))
         return pieces
 
+    def position(self, board):
+        """ Position of a padded board """
+        return Position.from_board(board, 1, self.geometry)
+
     def find_possible_moves(self, board, player):
+        """ Walks the list board: for a single call it beats packing the board into bitboards """
+        size = self.geometry.SIZE
+        opponent = -player
         moves = set()
         for xb in self.x_board:
+            line = board[xb]
             for yb in self.y_board:
-                if board[xb][yb] == player:
-                    for xs in self.x_square:
-                        for ys in self.y_square:
-                            if board[xb + xs][yb + ys] == -player:
-                                x_to_evaluate = xb + xs * 2
-                                y_to_evaluate = yb + ys * 2
-                                while 1 <= x_to_evaluate <= 6 and 1 <= y_to_evaluate <= 6:
-                                    if board[x_to_evaluate][y_to_evaluate] == 0:
-                                        moves.add((x_to_evaluate, y_to_evaluate))
-                                        break
-                                    elif board[x_to_evaluate][y_to_evaluate] == player:
-                                        break
-                                    else:
-                                        x_to_evaluate += xs
-                                        y_to_evaluate += ys
+                if line[yb] == player:
+                    for xs, ys in STEPS:
+                        x_to_evaluate = xb + xs
+                        y_to_evaluate = yb + ys
+                        # the padding is 0, so the walk stops at the edge of the board
+                        if board[x_to_evaluate][y_to_evaluate] == opponent:
+                            while board[x_to_evaluate][y_to_evaluate] == opponent:
+                                x_to_evaluate += xs
+                                y_to_evaluate += ys
+                            if (board[x_to_evaluate][y_to_evaluate] == 0 and 1 <= x_to_evaluate <= size
+                                    and 1 <= y_to_evaluate <= size):
+                                moves.add((x_to_evaluate, y_to_evaluate))
         return tuple(moves)
 
     def update_board(self, board, row, column, player):
-        board = [z[:] for z in board]
-        board[row][column] = player
-        for xs in self.x_square:
-            for ys in self.y_square:
-                if board[row + xs][column + ys] == -player:
-                    board_mask = [z[:] for z in board]
-                    x_to_evaluate = row + xs
-                    y_to_evaluate = column + ys
-                    while 1 <= x_to_evaluate <= 6 and 1 <= y_to_evaluate <= 6:
-                        if board_mask[x_to_evaluate][y_to_evaluate] == player:
-                            board = board_mask
-                            break
-                        elif board_mask[x_to_evaluate][y_to_evaluate] == -player:
-                            board_mask[x_to_evaluate][y_to_evaluate] = player
-                            x_to_evaluate += xs
-                            y_to_evaluate += ys
-                        else:
-                            break
+        """ The board after the move: the flipped pieces are found on `board`, which is copied once """
+        if self.stats is not None:
+            self.stats.count('update_board')
+        opponent = -player
+        changed = [(row, column)]
+        for xs, ys in STEPS:
+            x_to_evaluate = row + xs
+            y_to_evaluate = column + ys
+            line = []
+            while board[x_to_evaluate][y_to_evaluate] == opponent:
+                line.append((x_to_evaluate, y_to_evaluate))
+                x_to_evaluate += xs
+                y_to_evaluate += ys
+            if line and board[x_to_evaluate][y_to_evaluate] == player:
+                changed += line
+        board = [line[:] for line in board]
+        for x, y in changed:
+            board[x][y] = player
         return board
 
     def next_layer(self, board, player, return_moves=True, recursive=False):
         """ board: np.array """
-        moves = {}
-        for xb in self.x_board:
-            for yb in self.y_board:
-                if board[xb, yb] == player:
-                    for xs in self.x_square:
-                        for ys in self.y_square:
-                            if board[xb + xs, yb + ys] == -player:
-                                x_to_evaluate = xb + xs * 2
-                                y_to_evaluate = yb + ys * 2
-                                while 1 <= x_to_evaluate <= 6 and 1 <= y_to_evaluate <= 6:
-                                    if board[x_to_evaluate, y_to_evaluate] == 0:
-                                        moves.setdefault((x_to_evaluate, y_to_evaluate), [])
-                                        moves[(x_to_evaluate, y_to_evaluate)].append((xb, yb))
-                                        break
-                                    elif board[x_to_evaluate, y_to_evaluate] == player:
-                                        break
-                                    else:
-                                        x_to_evaluate += xs
-                                        y_to_evaluate += ys
-        if len(moves) == 0 and not recursive:
+        geometry = self.geometry
+        size = geometry.SIZE
+        own, opp = relative(*geometry.pack(board), player)
+        moves = geometry.legal_moves(own, opp)
+        if moves == 0 and not recursive:
             return self.next_layer(board, -player, False, True)
-        elif len(moves) == 0 and recursive:
+        elif moves == 0 and recursive:
             return np.array([board])
-        list_of_results = np.array([board] * len(moves))
-        n = 0
-        for (xmove, ymove), start_cells in moves.items():
-            list_of_results[n, xmove, ymove] = player
-            for xcell, ycell in start_cells:
-                dirx = abs(xmove - xcell)
-                diry = abs(ymove - ycell)
-                signdirx = dirx and (xmove - xcell) // dirx or 0
-                signdiry = diry and (ymove - ycell) // diry or 0
-                for i in range(max(dirx, diry) - 1):
-                    xcell += signdirx
-                    ycell += signdiry
-                    list_of_results[n, xcell, ycell] = player
-            n += 1
+        squares = list(iter_squares(moves))
+        if self.stats is not None:
+            self.stats.count('next_layer')
+            self.stats.count('next_layer_children', len(squares))
+        whites, blacks = zip(*[absolute(*geometry.play(own, opp, square), player) for square in squares])
+        list_of_results = np.zeros((len(squares),) + board.shape, dtype=board.dtype)
+        list_of_results[:, 1:size + 1, 1:size + 1] = geometry.unpack_many(whites, blacks).reshape(-1, size, size)
         if return_moves:
-            return list(moves.keys()), list_of_results
+            return [(square // size + 1, square % size + 1) for square in squares], list_of_results
         else:
             return list_of_results
 
     def find_best_move_simple(self, board):
-        moves, boards = self.next_layer(np.array(board), -1)
-        move = moves[boards.sum(axis=2).sum(axis=1).argmin()]
-        return move
+        return to_coordinates(self.best_move_simple(self.position(board)), self.geometry.SIZE)
 
     def find_best_move_model(self, board, move_number):
-        scores = []
-        moves, boards = self.next_layer(np.array(board), -1)
-        if move_number < 30:
-            boards_second_layer = [self.next_layer(np.array(board), 1, return_moves=False)[:, 1:7, 1:7] for board in boards]
-            model = self.models[move_number + 2]
-            for boards in boards_second_layer:
-                scores.append(max([model.predict(board.reshape(1, -1))[0] for board in boards]))
-        else:
-            model = self.models[move_number + 1]
-            scores.append([model.predict(board[1:7, 1:7].reshape(1, -1))[0] for board in boards])
-        move = moves[scores.index(min(scores))]
-        return move
+        return to_coordinates(self.best_move_model(self.position(board), move_number), self.geometry.SIZE)
+
+    def find_best_move_search(self, board, move_number, depth=4, time_ms=None, player=-1):
+        """ Alpha-beta search to `depth` plies within `time_ms`. move_number is only accepted to match
+        find_best_move_model: the search picks the model of every leaf by its number of pieces, which counts the
+        moves played without the passes """
+        square = self.best_move_search(self.position(board), depth, time_ms, player)
+        return to_coordinates(square, self.geometry.SIZE)
 
     def test_vs_random_bot(self, _):
-        board = self.reset_board()
+        geometry = self.geometry
+        white, black = geometry.START_WHITE, geometry.START_BLACK
         player = 1
         move_count = 0
         no_possible_moves = [False, False]
         while True:
-            moves = self.find_possible_moves(board, player)
+            own, opp = relative(white, black, player)
+            moves = tuple(iter_squares(geometry.legal_moves(own, opp)))
             if len(moves) == 0:  # if no possible moves: for both player end the iothello, else change player and continue
                 no_possible_moves[max(0, player)] = True
                 if all(no_possible_moves):
-                    return np.sum(board)
+                    return popcount(white) - popcount(black)
                 else:
                     player = -player
                     continue
             elif player == 1:
-                movex, movey = choice(moves)
+                square = choice(moves)
                 no_possible_moves[1] = False
             else:
-                if move_count == 31:
-                    movex, movey = self.find_best_move_simple(board)
+                if move_count == geometry.MAX_MOVES - 1:
+                    square = self.best_move_simple(Position(white, black, geometry))
                 else:
-                    movex, movey = self.find_best_move_model(board, move_count)
+                    square = self.best_move_model(Position(white, black, geometry), move_count)
                 no_possible_moves[0] = False
-            board = self.update_board(board, movex, movey, player)
+            white, black = absolute(*geometry.play(own, opp, square), player)
             player = -player
             move_count += 1
 
-    def multiprocessing_test_vs_random_bot(self, simulations, n_jobs=cpu_count() - 2):
+    def multiprocessing_test_vs_random_bot(self, simulations, n_jobs=cpu_count() - 2, seed=0):
+        from tqdm import tqdm
+        self.load_engine()
         if not self.models:
             raise ValueError("There aren't any models!")
-        tests = process_map(self.test_vs_random_bot, range(simulations), max_workers=n_jobs, chunksize=1,
-                            total=simulations, unit='simulations', mininterval=1, smoothing=0.2, desc='Running simulations... ')
+        records = play_tournament('random', 'model', simulations, n_jobs, seed=seed, alternate=False,
+                                  size=self.geometry.SIZE)
+        tests = [record['score'] for record in tqdm(records, total=simulations, unit='simulations', mininterval=1,
+                                                    smoothing=0.2, desc='Running simulations... ')]
         return tests
 
-    def random_simulations(self, simulations=10000, to_csv=False):
-        progress_bar = tqdm(range(simulations), total=simulations, unit='simulation', mininterval=1, desc='Running random simulations... ')
-        X = np.zeros((32, simulations, 36), dtype=np.int8)
-        y = np.zeros(simulations, dtype=np.int8)
-        for i in progress_bar:
-            player = 1
-            move_count = 0
-            while True:
-                moves = self.find_possible_moves(self.board, player)
-                if len(moves) == 0:
-                    self.no_possible_moves[max(0, player)] = True
-                    if all(self.no_possible_moves):
-                        y[i] = np.sum(self.board)
-                        break
-                    else:
-                        player = -player
-                        continue
-                elif player == 1:
-                    movex, movey = choice(moves)
-                    self.no_possible_moves[1] = False
-                else:
-                    movex, movey = choice(moves)
-                    self.no_possible_moves[0] = False
-                self.board = self.update_board(self.board, movex, movey, player)
-                player = -player
-                X[move_count, i] = list(chain(*[i[1:7] for i in self.board[1:7]]))
-                move_count += 1
-            self.board = self.reset_board()
-        if to_csv:
-            os.mkdir('data')
-            np.savetxt(join('data', 'y_sum.csv'), y, fmt='%i', delimiter=",")
-            for i in range(X.shape[0]):
-                np.savetxt(join('data', f'{i}.csv'), X[i, :, :], fmt='%i', delimiter=",")
+    def random_simulations(self, simulations=10000, to_disk=False, seed=None, directory='data', shard_size=100000,
+                           n_jobs=cpu_count() - 2, to_csv=None):
+        """ to_disk: write the games as binary shards in `directory` instead of returning them
+        to_csv: deprecated alias of to_disk, the games aren't written as csv anymore """
+        if to_csv is not None:
+            warnings.warn('to_csv is deprecated, use to_disk: the games are written as binary shards',
+                          DeprecationWarning, stacklevel=2)
+            to_disk = to_csv
+        if to_disk:
+            generate_shards(simulations, directory, shard_size, n_jobs, seed, self.geometry.SIZE)
         else:
-            return X, y
-
-    @staticmethod
-    def train_models():
-        os.mkdir('models_others')
-        y = np.genfromtxt(join('data', 'y_sum.csv'), delimiter=',', dtype=np.int8)
-        progress_bar = tqdm(range(32), total=32, desc='Computing models for every moves... ', unit='moves')
+            return random_games(simulations, seed=seed, size=self.geometry.SIZE)
+
+    def train_models(self, directory='data', incremental=False, symmetric=False):
+        """ incremental: fit the models from the normal equations saved in models_others, updated with the shards
+        added since the last training, instead of refitting on the whole dataset
+        symmetric: fit every board together with its 8 symmetric forms """
+        import joblib
+        from sklearn.linear_model import Ridge
+        from tqdm import tqdm
+        os.makedirs('models_others', exist_ok=True)
+        if incremental:
+            accumulator = accumulate(directory, join('models_others', 'normal_equations.npz'), self.geometry.SIZE)
+        max_moves = self.geometry.MAX_MOVES
+        progress_bar = tqdm(range(max_moves), total=max_moves, desc='Computing models for every moves... ',
+                            unit='moves')
+        models = []
         for move in progress_bar:
-            X = np.genfromtxt(join('data', f'{move}.csv'), delimiter=',', dtype=np.int8)
-            X_non_zero_indices = np.where((np.count_nonzero(X, axis=1) > 0))[0]
-            model = Ridge(alpha=1, max_iter=10000)
-            model.fit(X[X_non_zero_indices], y[X_non_zero_indices])
+            if incremental:
+                model = Ridge(alpha=1)
+                model.coef_, model.intercept_ = accumulator.solve(move, alpha=1, symmetric=symmetric)
+                model.n_features_in_ = model.coef_.shape[0]
+            else:
+                X, y = load_move(directory, move, self.geometry.SIZE)
+                if symmetric:
+                    X, y = augment(X, y)
+                model = Ridge(alpha=1, max_iter=10000)
+                model.fit(X, y)
             filename = join(f'models_others', f'{move}_ridge.sav')
             joblib.dump(model, filename)
+            models.append(model)
+        np.save(join('models_others', 'weights.npy'), weights.pack_models(models))
 
 
 if __name__ == '__main__':
 
     othello = Othello()
-    #othello.random_simulations(simulations=10000, to_csv=True)
+    #othello.random_simulations(simulations=10000, to_disk=True)
     #othello.train_models()
 
     results = othello.multiprocessing_test_vs_random_bot(simulations=10000)
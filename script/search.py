@@ -0,0 +1,201 @@
+""" Negamax search with alpha-beta pruning and iterative deepening, scoring the leaves with the Ridge models. """
+from functools import lru_cache
+from time import perf_counter
+
+from iothello.bitboard import board_geometry, iter_squares, absolute, popcount
+from iothello.endgame import EndgameSolver, ENDGAME_EMPTIES
+from iothello.transposition import EXACT, LOWER, UPPER, zobrist_function
+
+INFINITY = float('inf')
+TERMINAL_DEPTH = 64
+
+
+def square_priority(row, col, size):
+    """ Static move ordering: corners first, then the center, the edges, the second lines and last the squares next
+    to the corners """
+    distances = sorted((min(row, size - 1 - row), min(col, size - 1 - col)))
+    if distances == [0, 0]:
+        return 0
+    elif distances == [1, 1]:
+        return 5
+    elif distances == [0, 1]:
+        return 4
+    return {0: 2, 1: 3}.get(distances[0], 1)
+
+
+@lru_cache(maxsize=None)
+def square_priorities(size):
+    return tuple(square_priority(square // size, square % size, size) for square in range(size * size))
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class Search:
+    """ Searches the best move for the player to move.
+
+    evaluator: evaluation.Evaluator, the score of the leaves from white's point of view is updated move by move
+    with its delta rather than computed at every leaf
+    depth: maximum depth of the iterative deepening
+    time_ms, max_nodes: optional budget, when it runs out the best move of the last completed depth is kept
+    stop: optional threading.Event, setting it from another thread ends the search as a spent budget does
+    table: optional transposition.TranspositionTable, shared across searches to reuse their results
+    endgame_empties: positions with this many empty squares or fewer are solved exactly by endgame.EndgameSolver
+    geometry: bitboard.Geometry of the positions, of the default size when None
+    """
+
+    def __init__(self, evaluator, depth=4, time_ms=None, max_nodes=None, table=None, endgame_empties=ENDGAME_EMPTIES,
+                 stop=None, geometry=None):
+        self.geometry = geometry = geometry or board_geometry()
+        self.legal_moves = geometry.legal_moves
+        self.flips = geometry.flips
+        self.zobrist = zobrist_function(geometry.SIZE)
+        self.priorities = square_priorities(geometry.SIZE)
+        self.evaluator = evaluator
+        self.table = table
+        self.endgame_empties = endgame_empties
+        self.depth = depth
+        self.time_ms = time_ms
+        self.max_nodes = max_nodes
+        self.stop = stop
+        self.nodes = 0
+        self.leaves = 0
+        self.completed_depth = 0
+        self.score = None
+        self.deadline = None
+        self.leaf_index = None
+
+    def best_move(self, own, opp, player):
+        """ Returns the best square for `player`, the owner of `own`, or None if it has to pass. """
+        moves = self.legal_moves(own, opp)
+        if moves == 0:
+            return None
+        self.nodes = 0
+        self.leaves = 0
+        self.completed_depth = 0
+        empties = popcount(self.geometry.FULL & ~(own | opp))
+        if empties <= self.endgame_empties:
+            solver = EndgameSolver(self.geometry)
+            square, self.score = solver.best_move(own, opp)
+            self.nodes, self.completed_depth = solver.nodes, empties
+            return square
+        self.deadline = perf_counter() + self.time_ms / 1000 if self.time_ms is not None else None
+        squares = self.order(own, opp, moves, self.depth)
+        key = None
+        if self.table is not None:
+            key = self.zobrist(*absolute(own, opp, player), player)
+            entry = self.table.probe(key)
+            if entry is not None and entry[3] is not None:
+                squares.remove(entry[3])
+                squares.insert(0, entry[3])
+        best_square = squares[0]
+        for depth in range(1, self.depth + 1):
+            try:
+                score, square = self.root(own, opp, player, squares, depth)
+            except SearchTimeout:
+                break
+            best_square, self.score, self.completed_depth = square, score, depth
+            if key is not None:
+                self.table.store(key, depth, score, EXACT, square)
+            # the best move of the previous iteration is searched first
+            squares.remove(square)
+            squares.insert(0, square)
+        return best_square
+
+    def root(self, own, opp, player, squares, depth):
+        # every move adds a piece and a pass doesn't decrease the depth, so all the leaves have the same model
+        evaluator = self.evaluator
+        index = self.leaf_index = evaluator.pieces_index(popcount(own | opp) + depth)
+        static = evaluator.score(index, *absolute(own, opp, player))
+        alpha = -INFINITY
+        best_square = squares[0]
+        flips = self.flips
+        for square in squares:
+            flipped = flips(own, opp, square)
+            child_static = static + player * evaluator.delta(index, square, flipped)
+            score = -self.negamax(opp & ~flipped, own | flipped | (1 << square), -player, depth - 1, -INFINITY, -alpha,
+                                  child_static)
+            if score > alpha:
+                alpha = score
+                best_square = square
+        return alpha, best_square
+
+    def negamax(self, own, opp, player, depth, alpha, beta, static):
+        """ static: score of the board from white's point of view by the model of the leaves """
+        self.nodes += 1
+        if self.nodes & 1023 == 0:
+            self.check_budget()
+        table = self.table
+        tt_move = None
+        if table is not None:
+            key = self.zobrist(*absolute(own, opp, player), player)
+            entry = table.probe(key)
+            if entry is not None:
+                entry_depth, value, flag, tt_move = entry
+                if entry_depth >= depth:
+                    if flag == EXACT:
+                        return value
+                    elif flag == LOWER and value >= beta:
+                        return value
+                    elif flag == UPPER and value <= alpha:
+                        return value
+        legal_moves = self.legal_moves
+        moves = legal_moves(own, opp)
+        if moves == 0:
+            if legal_moves(opp, own) == 0:
+                value = popcount(own) - popcount(opp)
+                if table is not None:
+                    table.store(key, TERMINAL_DEPTH, value, EXACT)
+                return value
+            return -self.negamax(opp, own, -player, depth, -beta, -alpha, static)
+        if depth == 0:
+            self.leaves += 1
+            value = player * static
+            if table is not None:
+                table.store(key, 0, value, EXACT)
+            return value
+        alpha_start = alpha
+        best = -INFINITY
+        best_square = None
+        squares = self.order(own, opp, moves, depth)
+        if tt_move is not None:
+            squares.remove(tt_move)
+            squares.insert(0, tt_move)
+        delta = self.evaluator.delta
+        flips = self.flips
+        index = self.leaf_index
+        for square in squares:
+            flipped = flips(own, opp, square)
+            score = -self.negamax(opp & ~flipped, own | flipped | (1 << square), -player, depth - 1, -beta, -alpha,
+                                  static + player * delta(index, square, flipped))
+            if score > best:
+                best = score
+                best_square = square
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        if table is not None:
+            flag = UPPER if best <= alpha_start else LOWER if best >= beta else EXACT
+            table.store(key, depth, best, flag, best_square)
+        return best
+
+    def order(self, own, opp, moves, depth):
+        squares = sorted(iter_squares(moves), key=self.priorities.__getitem__)
+        if depth >= 3:
+            # far from the leaves it pays to try first the moves leaving the opponent with fewer replies
+            squares.sort(key=lambda square: self.opponent_mobility(own, opp, square))
+        return squares
+
+    def opponent_mobility(self, own, opp, square):
+        new_own, new_opp = self.geometry.play(own, opp, square)
+        return popcount(self.legal_moves(new_opp, new_own))
+
+    def check_budget(self):
+        if self.deadline is not None and perf_counter() > self.deadline:
+            raise SearchTimeout
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            raise SearchTimeout
+        if self.stop is not None and self.stop.is_set():
+            raise SearchTimeout
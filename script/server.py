@@ -0,0 +1,249 @@
+""" Headless engine speaking a line protocol, on stdin/stdout or to many clients over TCP.
+
+Every command is a line, every answer a line starting with '=' on success or '?' on error, as in GTP:
+
+    new                     the starting position, white to move
+    position <board> <w|b>  board: the SIZE * SIZE squares row by row, 'w' white, 'b' black, '-' empty
+    play <square|pass>      plays for the player to move, squares are a1 to f6 (h8 on 8x8): column letter then row
+                            number
+    moves                   legal moves of the player to move
+    show                    the board and the player to move, as given to position
+    go [depth N] [time MS]  best move for the player to move, by the model unless a depth or time is given: a
+                            search of at most MAX_DEPTH plies and MAX_TIME_MS, GO_TIME_MS by default
+    stop                    over TCP, ends the go of the session early, which answers the best move found so far
+    eval <board> ...        model scores from white's point of view of any number of boards
+    quit
+
+    python -m iothello.server                # stdin/stdout
+    python -m iothello.server --port 5000    # TCP, one session per connection
+    python -m iothello.server --size 8       # the 8x8 board
+
+All the sessions of a process share one Engine, so its models, book and tables stay warm across games. The board size
+is the one of the engine.
+"""
+import argparse
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from inspect import signature
+from threading import Event
+
+import numpy as np
+
+from iothello.bitboard import SIZE, popcount
+from iothello.core import Engine, Position
+from iothello.evaluation import score_bitboards
+
+COLUMNS = 'abcdefgh'
+PIECES = {'w': 1, 'b': -1, '-': 0}
+PLAYERS = {'w': 1, 'b': -1}
+# with only a time budget the search deepens until the time runs out
+TIME_DEPTH = 32
+# all the sessions share one worker thread, a search can't hold it for long
+MAX_DEPTH = TIME_DEPTH
+GO_TIME_MS = 10000
+MAX_TIME_MS = 60000
+USAGE = {'new': 'new', 'position': 'position <board> <w|b>', 'play': 'play <square|pass>', 'moves': 'moves',
+         'show': 'show', 'go': 'go [depth N] [time MS]', 'stop': 'stop', 'eval': 'eval <board> ...'}
+
+
+def parse_square(text, size=SIZE):
+    columns = COLUMNS[:size]
+    if len(text) < 2 or text[0] not in columns or not text[1:].isdigit() or not 1 <= int(text[1:]) <= size:
+        raise ValueError(f'Unknown square {text}')
+    return (int(text[1:]) - 1) * size + columns.index(text[0])
+
+
+def format_square(square, size=SIZE):
+    return f'{COLUMNS[square % size]}{square // size + 1}'
+
+
+def parse_board(text, size=SIZE):
+    """ (white, black) of a board of size * size 'w', 'b' or '-' """
+    squares = size * size
+    if len(text) != squares or set(text) - set(PIECES):
+        raise ValueError(f'A board is {squares} characters among {"".join(PIECES)}')
+    white = sum(1 << square for square, piece in enumerate(text) if piece == 'w')
+    black = sum(1 << square for square, piece in enumerate(text) if piece == 'b')
+    return white, black
+
+
+def format_board(white, black, size=SIZE):
+    return ''.join('w' if white >> square & 1 else 'b' if black >> square & 1 else '-'
+                   for square in range(size * size))
+
+
+class Session:
+    """ The position of one client, the engine is shared """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.size = engine.geometry.SIZE
+        self.position = Position(geometry=engine.geometry)
+        self.player = 1
+        # set by serve_tcp as soon as a stop arrives, while the go runs on the worker thread
+        self.stop = Event()
+
+    def handle(self, line):
+        """ Answer to a command line """
+        command, *args = line.split()
+        handler = getattr(self, f'do_{command}', None)
+        if handler is None:
+            return f'? unknown command {command}'
+        try:
+            signature(handler).bind(*args)
+        except TypeError:
+            return f'? usage: {USAGE[command]}'
+        try:
+            return f'= {handler(*args)}'.rstrip()
+        except (ValueError, TypeError, IndexError) as error:
+            return f'? {error}'
+
+    def do_new(self):
+        self.position = Position(geometry=self.engine.geometry)
+        self.player = 1
+        return ''
+
+    def do_position(self, board, player):
+        if player not in PLAYERS:
+            raise ValueError(f'Unknown player {player}')
+        self.position = Position(*parse_board(board, self.size), self.engine.geometry)
+        self.player = PLAYERS[player]
+        return ''
+
+    def do_play(self, move):
+        if move == 'pass':
+            if self.position.moves(self.player):
+                raise ValueError('pass with legal moves')
+        else:
+            square = parse_square(move, self.size)
+            if not self.position.moves(self.player) >> square & 1:
+                raise ValueError(f'illegal move {move}')
+            self.position.play(square, self.player)
+        self.player = -self.player
+        return ''
+
+    def do_moves(self):
+        return ' '.join(format_square(square, self.size) for square in self.position.squares(self.player))
+
+    def do_show(self):
+        board = format_board(self.position.white, self.position.black, self.size)
+        return f'{board} {"w" if self.player == 1 else "b"}'
+
+    def do_go(self, *options):
+        options = parse_options(options)
+        if not self.position.moves(self.player):
+            return 'pass'
+        engine = self.engine
+        if options:
+            square = engine.best_move_search(self.position, options.get('depth', TIME_DEPTH),
+                                             options.get('time', GO_TIME_MS), self.player, self.stop)
+        else:
+            move_number = popcount(self.position.white | self.position.black) - 4
+            square = engine.best_move_model(self.position, move_number, self.player)
+        return format_square(square, self.size)
+
+    def do_stop(self):
+        """ The go before it, if any, is over: the next one starts afresh """
+        self.stop.clear()
+        return ''
+
+    def do_eval(self, *boards):
+        boards = [parse_board(board, self.size) for board in boards]
+        return ' '.join(f'{score:.6g}' for score in evaluate(self.engine, boards))
+
+
+def parse_options(options):
+    """ {'depth': N, 'time': MS} of the options of go, raises ValueError on unknown or out of range ones """
+    if len(options) % 2 or not all(value.isdigit() for value in options[1::2]):
+        raise ValueError(f'usage: {USAGE["go"]}')
+    options = dict(zip(options[::2], map(int, options[1::2])))
+    if set(options) - {'depth', 'time'}:
+        raise ValueError(f'usage: {USAGE["go"]}')
+    if not 1 <= options.get('depth', 1) <= MAX_DEPTH:
+        raise ValueError(f'The depth must be 1 to {MAX_DEPTH}')
+    if not 1 <= options.get('time', 1) <= MAX_TIME_MS:
+        raise ValueError(f'The time must be 1 to {MAX_TIME_MS} ms')
+    return options
+
+
+def evaluate(engine, boards):
+    """ Scores of the (white, black) boards by the model of their number of pieces, in a batch per model """
+    engine.load_engine()
+    if engine.models is None:
+        raise ValueError("There aren't any models!")
+    indices = np.array([engine.evaluator.model_index(white, black) for white, black in boards], dtype=int)
+    scores = np.empty(len(boards))
+    for index in np.unique(indices):
+        positions = np.flatnonzero(indices == index)
+        whites, blacks = zip(*(boards[position] for position in positions))
+        scores[positions] = score_bitboards(engine.models[index], whites, blacks)
+    return scores
+
+
+def serve_stdio(engine, stdin=sys.stdin, stdout=sys.stdout):
+    session = Session(engine)
+    for line in stdin:
+        if not line.strip():
+            continue
+        if line.split()[0] == 'quit':
+            break
+        print(session.handle(line), file=stdout, flush=True)
+
+
+async def serve_tcp(engine, host='127.0.0.1', port=5000):
+    """ Serves every connection with its own Session. The commands of all of them go through a single worker thread:
+    the engine isn't thread safe, and meanwhile the event loop keeps reading and writing the other sessions """
+    executor = ThreadPoolExecutor(max_workers=1)
+    loop = asyncio.get_running_loop()
+
+    async def client(reader, writer):
+        session = Session(engine)
+        lines = asyncio.Queue()
+
+        async def read():
+            """ Queues the commands as they arrive, so that a stop reaches the go running before it """
+            while True:
+                line = (await reader.readline()).decode()
+                if not line:
+                    # the client is gone, its search is of no use
+                    session.stop.set()
+                if not line or line.split()[:1] == ['quit']:
+                    await lines.put(None)
+                    return
+                if line.split()[:1] == ['stop']:
+                    session.stop.set()
+                await lines.put(line)
+
+        reading = asyncio.create_task(read())
+        try:
+            while True:
+                line = await lines.get()
+                if line is None:
+                    break
+                if line.strip():
+                    answer = await loop.run_in_executor(executor, session.handle, line)
+                    writer.write(answer.encode() + b'\n')
+                    await writer.drain()
+        finally:
+            reading.cancel()
+            session.stop.set()
+            writer.close()
+
+    server = await asyncio.start_server(client, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, help='serve over TCP on this port instead of stdin/stdout')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--size', type=int, default=SIZE, help='of the board')
+    args = parser.parse_args()
+    main_engine = Engine(args.size)
+    main_engine.load_engine()
+    if args.port is None:
+        serve_stdio(main_engine)
+    else:
+        asyncio.run(serve_tcp(main_engine, args.host, args.port))
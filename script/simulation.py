@@ -0,0 +1,105 @@
+""" Batched random self-play: thousands of games advance in lockstep as arrays of bitboards. """
+import numpy as np
+
+from iothello.bitboard import DIRECTIONS, EXTRA_SHIFTS, board_geometry, popcount_many
+
+
+def flips_many(own, opp, moves, directions=DIRECTIONS, extra_shifts=EXTRA_SHIFTS):
+    """ Vectorized bitboard.flips: moves holds the single bit of the square played in every game """
+    flipped = np.zeros_like(own)
+    for direction, mask in directions:
+        flankable = opp & mask
+        x = (moves << direction) & flankable
+        x |= (x << direction) & flankable
+        x |= (x << direction) & flankable
+        x |= (x << direction) & flankable
+        for _ in range(extra_shifts):
+            x |= (x << direction) & flankable
+        flipped |= np.where((x << direction) & own, x, 0)
+        x = (moves >> direction) & flankable
+        x |= (x >> direction) & flankable
+        x |= (x >> direction) & flankable
+        x |= (x >> direction) & flankable
+        for _ in range(extra_shifts):
+            x |= (x >> direction) & flankable
+        flipped |= np.where((x >> direction) & own, x, 0)
+    return flipped
+
+
+def random_moves(moves, rng):
+    """ One random bit of every (non zero) mask of legal moves """
+    skip = (rng.random(len(moves)) * popcount_many(moves)).astype(np.int64)
+    for _ in range(int(skip.max(initial=0))):
+        # drop the lowest bit of the games that haven't reached their random bit yet
+        drop = skip > 0
+        moves = np.where(drop, moves & (moves - 1), moves)
+        skip -= drop
+    return moves & -moves
+
+
+def random_games(simulations, seed=None, batch_size=100000, size=None, return_players=False):
+    """ Plays `simulations` games between two random bots on the board of `size`, the default one when None.
+
+    Returns X[move, simulation, SQUARES], the board after every move (zeros after the end of the game), and y, the final
+    sum of the board: the same layout as Othello.random_simulations.
+    return_players: also return players[move, simulation], the player to move on every board of X, passes included:
+    1 for white, -1 for black and 0 once the game is over
+    """
+    geometry = board_geometry(size)
+    max_moves, squares = geometry.MAX_MOVES, geometry.SQUARES
+    rng = np.random.default_rng(seed)
+    X = np.zeros((max_moves, simulations, squares), dtype=np.int8)
+    y = np.zeros(simulations, dtype=np.int8)
+    players = np.zeros((max_moves, simulations), dtype=np.int8)
+    for start in range(0, simulations, batch_size):
+        stop = min(start + batch_size, simulations)
+        whites, blacks, movers = play_random_games(stop - start, rng, geometry)
+        boards = geometry.unpack_many(whites.ravel(), blacks.ravel())
+        X[:, start:stop] = boards.reshape(max_moves, stop - start, squares)
+        last = np.maximum(np.count_nonzero(whites | blacks, axis=0) - 1, 0)
+        y[start:stop] = X[last, np.arange(start, stop)].sum(axis=1)
+        # the player to move on a board is the one who plays the next move
+        players[:-1, start:stop] = movers[1:]
+    if return_players:
+        return X, y, players
+    return X, y
+
+
+def play_random_games(games, rng, geometry=None):
+    """ Returns the (MAX_MOVES, games) white and black bitboards after every move, and the player who made every
+    move, 1 for white and -1 for black, 0 after the end of the game """
+    geometry = board_geometry() if geometry is None else geometry
+    max_moves, legal_moves_many = geometry.MAX_MOVES, geometry.python_legal_moves
+    whites = np.zeros((max_moves, games), dtype=np.uint64)
+    blacks = np.zeros((max_moves, games), dtype=np.uint64)
+    players = np.zeros((max_moves, games), dtype=np.int8)
+    # every game is stored from the point of view of the player to move, white moves first
+    own = np.full(games, geometry.START_WHITE, dtype=np.uint64)
+    opp = np.full(games, geometry.START_BLACK, dtype=np.uint64)
+    white_to_move = np.ones(games, dtype=bool)
+    move_count = np.zeros(games, dtype=np.int64)
+    passed = np.zeros(games, dtype=bool)
+    active = np.arange(games)
+    while len(active):
+        moves = legal_moves_many(own, opp)
+        can_move = moves != 0
+        # a game ends when both players have to pass
+        over = ~can_move & passed
+        passed = ~can_move
+        movers = np.flatnonzero(can_move)
+        square = random_moves(moves[movers], rng)
+        flipped = flips_many(own[movers], opp[movers], square, geometry.DIRECTIONS, geometry.EXTRA_SHIFTS)
+        own[movers] |= flipped | square
+        opp[movers] &= ~flipped
+        game = active[movers]
+        whites[move_count[movers], game] = np.where(white_to_move[movers], own[movers], opp[movers])
+        blacks[move_count[movers], game] = np.where(white_to_move[movers], opp[movers], own[movers])
+        players[move_count[movers], game] = np.where(white_to_move[movers], 1, -1)
+        move_count[movers] += 1
+        # pass the turn, then drop the finished games
+        own, opp = opp, own
+        white_to_move = ~white_to_move
+        keep = ~over & (move_count < max_moves)
+        own, opp, white_to_move, move_count, passed, active = (
+            own[keep], opp[keep], white_to_move[keep], move_count[keep], passed[keep], active[keep])
+    return whites, blacks, players
@@ -0,0 +1,117 @@
+""" The 8 symmetries of the board: rotations and reflections, on bitboards and on (N, SQUARES) batches of boards.
+
+The rules of Othello don't change under them, so symmetric positions have the same value and the same best move up
+to the symmetry. canonical picks one representative of every class for the opening book, and augment multiplies the
+training data by 8 without playing more games. Symmetries holds the tables of a board size; transform and canonical
+are the ones of the default size, the batch functions take the size from the last axis of the boards.
+"""
+from functools import lru_cache
+from math import isqrt
+
+import numpy as np
+
+from iothello.bitboard import SIZE
+
+# the 8 symmetries of the square as maps of (row, col) on a board whose last row and column are `last`, the first
+# one is the identity
+SYMMETRIES = (
+    lambda row, col, last: (row, col),
+    lambda row, col, last: (col, last - row),
+    lambda row, col, last: (last - row, last - col),
+    lambda row, col, last: (last - col, row),
+    lambda row, col, last: (row, last - col),
+    lambda row, col, last: (last - row, col),
+    lambda row, col, last: (col, row),
+    lambda row, col, last: (last - col, last - row),
+)
+
+
+class Symmetries:
+    """ The symmetries of the board of `size`, on bitboards and on batches of boards """
+
+    def __init__(self, size):
+        squares = size * size
+        # SQUARE_MAPS[t][square] is the square which `square` is moved to by the symmetry t
+        self.SQUARE_MAPS = tuple(tuple(size * row + col for row, col in
+                                       (symmetry(square // size, square % size, size - 1) for square in range(squares)))
+                                 for symmetry in SYMMETRIES)
+        self.INVERSES = tuple(next(inverse for inverse, other in enumerate(self.SQUARE_MAPS)
+                                   if all(other[mapped] == square for square, mapped in enumerate(square_map)))
+                              for square_map in self.SQUARE_MAPS)
+        # a batch is moved by the symmetry t with boards[:, GATHER[t]]: square SQUARE_MAPS[t][s] takes the value of s
+        self.GATHER = np.array([self.SQUARE_MAPS[inverse] for inverse in self.INVERSES], dtype=np.intp)
+        self.BITS = np.left_shift(np.uint64(1), np.arange(squares, dtype=np.uint64))
+        self.TABLES = self.symmetry_tables(squares)
+
+    def symmetry_tables(self, squares):
+        """ Every map folded into one table of 256 masks per byte of the bitboard, as the Zobrist keys """
+        tables = []
+        for square_map in self.SQUARE_MAPS:
+            chunk_tables = []
+            for chunk in range((squares + 7) // 8):
+                table = [0] * 256
+                for byte in range(1, 256):
+                    low = byte & -byte
+                    square = chunk * 8 + low.bit_length() - 1
+                    table[byte] = table[byte ^ low] | (1 << square_map[square] if square < squares else 0)
+                chunk_tables.append(table)
+            tables.append(chunk_tables)
+        return tables
+
+    def transform(self, mask, symmetry):
+        result = 0
+        for table in self.TABLES[symmetry]:
+            result |= table[mask & 255]
+            mask >>= 8
+        return result
+
+    def canonical(self, white, black):
+        """ Returns (white, black, symmetry) of the smallest of the symmetric forms of the board """
+        best = (white, black, 0)
+        for symmetry in range(1, len(self.TABLES)):
+            candidate = (self.transform(white, symmetry), self.transform(black, symmetry), symmetry)
+            if candidate < best:
+                best = candidate
+        return best
+
+    def canonical_many(self, boards):
+        """ Vectorized canonical of (N, SQUARES) boards of 1, -1 and 0, returns (canonical boards, symmetries) """
+        boards = np.asarray(boards)
+        candidates = boards[:, self.GATHER]
+        # the same order as canonical: the smallest white bitboard, then the smallest black one
+        whites = (candidates == 1) @ self.BITS
+        blacks = (candidates == -1) @ self.BITS
+        symmetries = np.lexsort((blacks, whites), axis=1)[:, 0]
+        return candidates[np.arange(len(boards)), symmetries], symmetries
+
+
+@lru_cache(maxsize=None)
+def symmetries(size):
+    return Symmetries(size)
+
+
+def of_boards(boards):
+    """ The Symmetries of a batch of boards (..., SQUARES) """
+    return symmetries(isqrt(np.shape(boards)[-1]))
+
+
+DEFAULT = symmetries(SIZE)
+SQUARE_MAPS, INVERSES, GATHER, TABLES = DEFAULT.SQUARE_MAPS, DEFAULT.INVERSES, DEFAULT.GATHER, DEFAULT.TABLES
+transform, canonical = DEFAULT.transform, DEFAULT.canonical
+
+
+def transform_many(boards, symmetry):
+    """ boards (..., SQUARES) moved by `symmetry` """
+    return boards[..., of_boards(boards).GATHER[symmetry]]
+
+
+def canonical_many(boards):
+    """ Vectorized canonical of (N, SQUARES) boards of 1, -1 and 0, returns (canonical boards, symmetries) """
+    return of_boards(boards).canonical_many(boards)
+
+
+def augment(X, y):
+    """ The 8 symmetric forms of every board of X (N, SQUARES), with their outcomes y """
+    symmetries_count = len(SYMMETRIES)
+    X = np.concatenate([transform_many(X, symmetry) for symmetry in range(symmetries_count)])
+    return X, np.tile(y, symmetries_count)
@@ -0,0 +1,155 @@
+""" Matches between two bots over a pool of worker processes.
+
+Agents are given by name: 'random', 'greedy', 'model' (the depth 2 minimax of find_best_move_model) and
+'search-<depth>' or 'search-<depth>-<ms>ms' (alpha-beta search with an optional time budget per move).
+Every worker builds its agents once and plays a batch of games per task, the results are streamed game by game.
+The agents are told apart by side, 'first' and 'second', so that a bot can play against itself with two engines.
+With --stats every record has the instrumentation.Stats summary of both sides, merged over all games at the end.
+
+    python -m iothello.tournament model random --games 1000 --jobs 4
+    python -m iothello.tournament greedy random --size 8
+"""
+import argparse
+import json
+import re
+from multiprocessing import Pool, cpu_count
+from random import Random
+from time import perf_counter
+
+from iothello.bitboard import SIZE, board_geometry
+from iothello.core import Engine, Position
+from iothello.instrumentation import Stats, merge
+
+SEARCH_AGENT = re.compile(r'search-(\d+)(?:-(\d+)ms)?')
+
+
+def make_agent(name, size=None):
+    """ Returns agent(position, move_count, player, rng) -> square for the board of `size`, with its Engine as
+    agent.engine, None for 'random' """
+    search = SEARCH_AGENT.fullmatch(name)
+    if name not in ('random', 'greedy', 'model') and search is None:
+        raise ValueError(f'Unknown agent {name}')
+    if name == 'random':
+        agent = lambda position, move_count, player, rng: rng.choice(position.squares(player))
+        agent.engine = None
+        return agent
+    engine = Engine(size)
+    engine.load_engine()
+    if name == 'greedy':
+        agent = lambda position, move_count, player, rng: engine.best_move_simple(position, player)
+    elif name == 'model':
+        agent = lambda position, move_count, player, rng: engine.best_move_model(position, move_count, player)
+    else:
+        depth, time_ms = search.groups()
+        depth, time_ms = int(depth), int(time_ms) if time_ms else None
+        agent = lambda position, move_count, player, rng: engine.best_move_search(position, depth, time_ms, player)
+    agent.engine = engine
+    return agent
+
+
+def play_game(white, black, rng, geometry=None):
+    """ Returns (final sum of the board, number of moves, seconds per move of white, of black) """
+    agents = {1: white, -1: black}
+    seconds = {1: 0.0, -1: 0.0}
+    moves = {1: 0, -1: 0}
+    position = Position(geometry=geometry)
+    player = 1
+    passed = False
+    while True:
+        if not position.moves(player):
+            if passed:
+                break
+            passed = True
+            player = -player
+            continue
+        passed = False
+        start = perf_counter()
+        square = agents[player](position, moves[1] + moves[-1], player, rng)
+        seconds[player] += perf_counter() - start
+        moves[player] += 1
+        position.play(square, player)
+        player = -player
+    return (position.score(), moves[1] + moves[-1],
+            seconds[1] / max(moves[1], 1), seconds[-1] / max(moves[-1], 1))
+
+
+SIDES = ('first', 'second')
+_agents = {}
+
+
+def init_worker(first, second, size=None):
+    _agents['first'] = make_agent(first, size)
+    _agents['second'] = make_agent(second, size)
+
+
+def play_batch(task):
+    """ Plays the games [start, stop), `first` is white in the even games when alternating colors """
+    first, second, start, stop, seed, alternate, instrument, size = task
+    geometry = board_geometry(size)
+    names = {'first': first, 'second': second}
+    engines = {side: _agents[side].engine for side in SIDES if _agents[side].engine is not None}
+    records = []
+    for game in range(start, stop):
+        rng = Random(seed * 1000003 + game)
+        white, black = ('second', 'first') if alternate and game % 2 else ('first', 'second')
+        if instrument:
+            for engine in engines.values():
+                engine.stats = Stats()
+        score, length, white_seconds, black_seconds = play_game(_agents[white], _agents[black], rng, geometry)
+        record = {'game': game, 'white': names[white], 'black': names[black], 'first_is_white': white == 'first',
+                  'score': score, 'moves': length,
+                  'white_seconds_per_move': white_seconds, 'black_seconds_per_move': black_seconds}
+        if instrument:
+            record['stats'] = {side: engine.stats.summary() for side, engine in engines.items()}
+        records.append(record)
+    return records
+
+
+def play_tournament(first, second, games, n_jobs=cpu_count() - 2, batch_size=50, seed=0, alternate=True,
+                    instrument=False, size=None):
+    """ Yields the record of every game on the board of `size` as soon as its batch is over, not in order of
+    game """
+    tasks = [(first, second, start, min(start + batch_size, games), seed, alternate, instrument, size)
+             for start in range(0, games, batch_size)]
+    if n_jobs <= 1:
+        init_worker(first, second, size)
+        for task in tasks:
+            yield from play_batch(task)
+        return
+    with Pool(n_jobs, initializer=init_worker, initargs=(first, second, size)) as pool:
+        for records in pool.imap_unordered(play_batch, tasks):
+            yield from records
+
+
+def summary(records):
+    """ Wins, draws and losses of the first agent """
+    results = [0, 0, 0]
+    for record in records:
+        sign = (record['score'] > 0) - (record['score'] < 0)
+        results[1 - sign if record['first_is_white'] else 1 + sign] += 1
+    return dict(zip(('wins', 'draws', 'losses'), results))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('first')
+    parser.add_argument('second')
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--jobs', type=int, default=cpu_count() - 2)
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--same-colors', action='store_true', help="don't alternate colors, first is always white")
+    parser.add_argument('--stats', action='store_true', help='record the instrumentation of the engines')
+    parser.add_argument('--size', type=int, default=SIZE, help='of the board')
+    args = parser.parse_args()
+    all_records = []
+    for game_record in play_tournament(args.first, args.second, args.games, args.jobs, args.batch_size, args.seed,
+                                       not args.same_colors, args.stats, args.size):
+        all_records.append(game_record)
+        print(json.dumps(game_record), flush=True)
+    print(json.dumps({args.first: summary(all_records)}))
+    if args.stats:
+        names = {'first': args.first, 'second': args.second}
+        sides = {side for game_record in all_records for side in game_record['stats']}
+        print(json.dumps({f'{side} {names[side]}': merge(game_record['stats'][side] for game_record in all_records)
+                          for side in sorted(sides)}))
@@ -0,0 +1,86 @@
+""" Out-of-core training of the per-move Ridge models through their normal equations.
+
+With 36 features (64 on 8x8) a ridge regression is fully described by X'X and X'y (with a column of ones for the
+intercept), so the data can be streamed shard by shard, and the statistics saved to refine the models when new games
+arrive.
+"""
+import os
+from math import isqrt
+from os.path import basename, exists
+
+import numpy as np
+
+from iothello.bitboard import SQUARES, MAX_MOVES, board_geometry
+from iothello.dataset import shard_names, load_shards
+from iothello.symmetry import symmetries
+
+
+class RidgeAccumulator:
+    """ Normal equations of the MAX_MOVES ridge regressions, one per move """
+
+    def __init__(self, moves=MAX_MOVES, features=SQUARES):
+        self.XtX = np.zeros((moves, features + 1, features + 1))
+        self.Xty = np.zeros((moves, features + 1))
+        self.shards = []
+
+    def update(self, move, X, y):
+        """ Adds the boards X (n, SQUARES) of `move`, with the final sums y, to the statistics """
+        X = np.hstack([X, np.ones((len(X), 1), dtype=X.dtype)]).astype(np.float64)
+        self.XtX[move] += X.T @ X
+        self.Xty[move] += X.T @ y.astype(np.float64)
+
+    def update_shard(self, X, y):
+        """ Adds a whole shard X[move, simulation, SQUARES], leaving out the games already over at every move """
+        for move in range(len(self.XtX)):
+            played = np.count_nonzero(X[move], axis=1) > 0
+            self.update(move, np.asarray(X[move])[played], np.asarray(y)[played])
+
+    def solve(self, move, alpha=1.0, symmetric=False):
+        """ Returns (coef, intercept) of the ridge regression of `move`, the intercept isn't penalized as in
+        sklearn's Ridge.
+
+        symmetric: fit the boards augmented with their 8 symmetric forms, whose statistics are the ones of the
+        boards with rows and columns permuted, so that the data doesn't have to be augmented
+        """
+        XtX, Xty = self.XtX[move], self.Xty[move]
+        if symmetric:
+            features = XtX.shape[0] - 1
+            gather = symmetries(isqrt(features)).GATHER
+            columns = np.hstack([gather, np.full((len(gather), 1), features)])
+            XtX = sum(XtX[np.ix_(permutation, permutation)] for permutation in columns)
+            Xty = sum(Xty[permutation] for permutation in columns)
+        penalty = np.full(XtX.shape[0], alpha)
+        penalty[-1] = 0
+        weights = np.linalg.solve(XtX + np.diag(penalty), Xty)
+        return weights[:-1], weights[-1]
+
+    def save(self, filename):
+        np.savez(filename, XtX=self.XtX, Xty=self.Xty, shards=np.array(self.shards, dtype=str))
+
+    @classmethod
+    def load(cls, filename):
+        data = np.load(filename)
+        moves, columns = data['Xty'].shape
+        accumulator = cls(moves, columns - 1)
+        accumulator.XtX[:] = data['XtX']
+        accumulator.Xty[:] = data['Xty']
+        accumulator.shards = data['shards'].tolist()
+        return accumulator
+
+
+def accumulate(directory='data', state=None, size=None):
+    """ Updates the normal equations saved in `state` with the shards of `directory` not seen yet, and returns them;
+    `size` is the one of the board of new statistics """
+    if state is not None and exists(state):
+        accumulator = RidgeAccumulator.load(state)
+    else:
+        geometry = board_geometry(size)
+        accumulator = RidgeAccumulator(geometry.MAX_MOVES, geometry.SQUARES)
+    for name, (X, y) in zip(shard_names(directory), load_shards(directory)):
+        if basename(name) not in accumulator.shards:
+            accumulator.update_shard(X, y)
+            accumulator.shards.append(basename(name))
+    if state is not None:
+        os.makedirs(os.path.dirname(state) or '.', exist_ok=True)
+        accumulator.save(state)
+    return accumulator
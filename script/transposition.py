@@ -0,0 +1,95 @@
+""" Transposition table keyed by Zobrist hashes of bitboard positions. """
+from collections import OrderedDict
+from functools import lru_cache
+from random import Random
+
+from iothello.bitboard import SIZE
+
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+def zobrist_tables(chunks, seed=2021):
+    """ Per square random keys, folded into one table of 256 entries per byte of the bitboard so that
+    hashing a player takes a lookup per byte instead of one per piece """
+    rng = Random(seed)
+    tables = []
+    for _ in range(2):
+        keys = [rng.getrandbits(64) for _ in range(chunks * 8)]
+        player_tables = []
+        for chunk in range(chunks):
+            table = [0] * 256
+            for byte in range(1, 256):
+                low = byte & -byte
+                table[byte] = table[byte ^ low] ^ keys[chunk * 8 + low.bit_length() - 1]
+            player_tables.append(table)
+        tables.append(player_tables)
+    return tables, rng.getrandbits(64)
+
+
+@lru_cache(maxsize=None)
+def zobrist_function(size):
+    """ zobrist(white, black, player) of the board of `size`, a closure over its tables """
+    (white_keys, black_keys), black_to_move = zobrist_tables((size * size + 7) // 8)
+    keys = tuple(zip(white_keys, black_keys))
+
+    def zobrist(white, black, player):
+        key = black_to_move if player == -1 else 0
+        for white_table, black_table in keys:
+            key ^= white_table[white & 255] ^ black_table[black & 255]
+            white >>= 8
+            black >>= 8
+        return key
+
+    return zobrist
+
+
+zobrist = zobrist_function(SIZE)
+
+
+class TranspositionTable:
+    """ Bounded table of search results: key -> (depth, value, flag, move).
+
+    Values are from the point of view of the player to move, flag tells whether the value is EXACT or a LOWER/UPPER
+    bound. When an entry is stored again the deeper result is kept; when the table is full the least recently used
+    entry is evicted. The same table can be shared by many searches, games and the evaluator, since the static
+    score of a leaf is just an EXACT entry of depth 0.
+    """
+
+    def __init__(self, max_entries=1 << 18):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def probe(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return entry
+
+    def store(self, key, depth, value, flag, move=None):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            if entry[0] > depth:
+                return
+        elif len(self.entries) >= self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        self.entries[key] = (depth, value, flag, move)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        probes = self.hits + self.misses
+        return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'hit_rate': self.hits / probes if probes else 0.0}
@@ -0,0 +1,63 @@
+""" The per-move linear models packed in a single (MAX_MOVES, SQUARES + 1) float array: the weights of the squares
+and the intercept per move, (32, 37) on the 6x6 board and (60, 65) on 8x8, whose files are suffixed with _8x8.
+
+Loading it doesn't import scikit-learn nor unpickle any estimator, and the file is memory-mapped so that every
+process reading it shares the same pages.
+"""
+import os
+from os.path import join, dirname
+
+import numpy as np
+
+from iothello.bitboard import SIZE, MAX_MOVES
+
+MODELS_DIRECTORY = join(dirname(__file__), 'models')
+
+
+def model_path(name, extension, size=None):
+    """ Path of a file of the models directory for the board of `size`, of the default size when None """
+    size = SIZE if size is None else size
+    return join(MODELS_DIRECTORY, f'{name}{"" if size == 6 else f"_{size}x{size}"}.{extension}')
+
+
+def weights_file(size=None):
+    return model_path('weights', 'npy', size)
+
+
+WEIGHTS_FILE = weights_file()
+
+
+class LinearModel:
+    """ The coef_ and intercept_ of a fitted Ridge, enough to score boards """
+    __slots__ = ('coef_', 'intercept_')
+
+    def __init__(self, coef, intercept):
+        self.coef_ = coef
+        self.intercept_ = intercept
+
+    def predict(self, X):
+        return X @ self.coef_ + self.intercept_
+
+
+def load_weights(filename=WEIGHTS_FILE):
+    return np.load(filename, mmap_mode='r')
+
+
+def load_models(filename=WEIGHTS_FILE):
+    return [LinearModel(row[:-1], float(row[-1])) for row in load_weights(filename)]
+
+
+def pack_models(models):
+    """ (MAX_MOVES, SQUARES + 1) array of a list of fitted models """
+    return np.array([np.append(model.coef_, model.intercept_) for model in models], dtype=np.float64)
+
+
+def convert_models(directory=MODELS_DIRECTORY, filename=WEIGHTS_FILE, moves=MAX_MOVES):
+    """ Packs the {move}_ridge.sav pickles of `directory` into `filename` """
+    import joblib
+    models = [joblib.load(join(directory, f'{move}_ridge.sav')) for move in range(moves)]
+    np.save(filename, pack_models(models))
+
+
+def exists(filename=WEIGHTS_FILE):
+    return os.path.exists(filename)
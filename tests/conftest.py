@@ -0,0 +1,23 @@
+""" Imports the package as iothello from the sources of the repository, script/, rather than any installed copy. """
+import sys
+from importlib.util import module_from_spec, spec_from_file_location
+from pathlib import Path
+
+SOURCES = Path(__file__).resolve().parent.parent / 'script'
+
+
+def load_sources():
+    """ Registers script/ as the iothello package, unless it already is """
+    package = sys.modules.get('iothello')
+    if package is not None and list(getattr(package, '__path__', ())) == [str(SOURCES)]:
+        return package
+    for name in [name for name in sys.modules if name == 'iothello' or name.startswith('iothello.')]:
+        del sys.modules[name]
+    spec = spec_from_file_location('iothello', SOURCES / '__init__.py', submodule_search_locations=[str(SOURCES)])
+    package = module_from_spec(spec)
+    sys.modules['iothello'] = package
+    spec.loader.exec_module(package)
+    return package
+
+
+load_sources()
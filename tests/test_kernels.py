@@ -0,0 +1,89 @@
+""" The Numba kernels against the pure Python reference of bitboard and evaluation. """
+import os
+import subprocess
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip('numba')
+
+from iothello import kernels  # noqa: E402
+from iothello.benchmark import PERFT  # noqa: E402
+from iothello.bitboard import board_geometry, iter_squares  # noqa: E402
+from iothello.evaluation import python_score_bitboards  # noqa: E402
+
+GEOMETRY = board_geometry()
+SQUARES = GEOMETRY.SQUARES
+
+pytestmark = pytest.mark.skipif(not kernels.supports(GEOMETRY), reason=f'the kernels are off on {SQUARES} squares')
+
+
+@pytest.fixture(scope='module')
+def compiled():
+    return kernels.compile_kernels(GEOMETRY.DIRECTIONS, GEOMETRY.FULL, GEOMETRY.EXTRA_SHIFTS)
+
+
+@pytest.fixture(scope='module')
+def positions():
+    return kernels.random_positions(5000, seed=0, geometry=GEOMETRY)
+
+
+def test_legal_moves(compiled, positions):
+    legal_moves = compiled[0]
+    for own, opp in positions:
+        assert legal_moves(own, opp) == GEOMETRY.python_legal_moves(own, opp), (own, opp)
+
+
+def test_flips_of_every_empty_square(compiled, positions):
+    flips = compiled[1]
+    for own, opp in positions:
+        for square in range(SQUARES):
+            if not (own | opp) >> square & 1:
+                assert flips(own, opp, square) == GEOMETRY.python_flips(own, opp, square), (own, opp, square)
+
+
+def test_score_bitboards(positions):
+    rng = np.random.default_rng(0)
+    model = SimpleNamespace(coef_=rng.normal(size=SQUARES), intercept_=rng.normal())
+    whites, blacks = zip(*positions)
+    np.testing.assert_allclose(kernels.score_bitboards(model, whites, blacks),
+                               python_score_bitboards(model, whites, blacks), rtol=0, atol=1e-9)
+
+
+def count(legal_moves, flips, own, opp, depth):
+    if depth == 0:
+        return 1
+    moves = legal_moves(own, opp)
+    if moves == 0:
+        if legal_moves(opp, own) == 0:
+            return 1
+        return count(legal_moves, flips, opp, own, depth - 1)
+    leaves = 0
+    for square in iter_squares(moves):
+        flipped = flips(own, opp, square)
+        leaves += count(legal_moves, flips, opp & ~flipped, own | flipped | (1 << square), depth - 1)
+    return leaves
+
+
+@pytest.mark.parametrize('depth', range(1, min(len(PERFT), 6) + 1))
+def test_perft(compiled, depth):
+    assert count(*compiled, GEOMETRY.START_WHITE, GEOMETRY.START_BLACK, depth) == PERFT[depth - 1]
+
+
+
+def test_kernels_mode_with_kernels_imported_first():
+    """ IOTHELLO_KERNELS=numba in a fresh interpreter importing iothello.kernels before iothello.bitboard, as
+    python -m iothello.kernels does """
+    code = ('import conftest\n'
+            'from iothello import kernels\n'
+            'from iothello.bitboard import board_geometry\n'
+            'geometry = board_geometry()\n'
+            'print(geometry.legal_moves is kernels.compile_kernels(geometry.DIRECTIONS, geometry.FULL, '
+            'geometry.EXTRA_SHIFTS)[0])\n')
+    env = dict(os.environ, IOTHELLO_KERNELS='numba', PYTHONPATH=str(Path(__file__).parent))
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=env)
+    assert output.returncode == 0, output.stderr
+    assert output.stdout.split() == ['True']